@@ -1,15 +1,15 @@
 import asyncio
-from collections import deque
 from dataclasses import dataclass, field
 import re
-from uuid import uuid4
+from typing import TYPE_CHECKING, Optional, Union
 
 from src.aligner import m2m_aligner
-from src.aligner.process import fmt_input_word, fmt_phonemes, output_line_is_word, postprocess
-from src.aligner.word import Word
+from src.aligner.lookup import AlignmentLookup, cmudict_lookup
+from src.aligner.process import Processor, fmt_input_word, fmt_phonemes, input_word_key, output_line_key, postprocess
 
-def generate_filename(mode: str, func=uuid4) -> str:
-    return str(m2m_aligner.VAR_DIR) + '/' + mode + '-' + str(func())
+# the G2P model is only loaded when text is aligned
+if TYPE_CHECKING:
+    from src.aligner.word import Word
 
 @dataclass
 class WordGroupAligner:
@@ -17,72 +17,107 @@ class WordGroupAligner:
     A class for aligning words using the m2m-aligner model.
     '''
 
-    words: list[Word] = field(init=False, default_factory=list)
-    input_file: str = field(init=False, default=generate_filename('in'))
-    output_file: str = field(init=False, default=generate_filename('out'))
+    words: list['Word'] = field(init=False, default_factory=list)
+    lookup: Optional[AlignmentLookup] = field(default=cmudict_lookup, repr=False)
+    # the shared pool for the running event loop is used if not set
+    pool: Optional[m2m_aligner.M2MAlignerPool] = field(default=None, repr=False)
 
-    def add_word(self, word: Word) -> None:
+    def add_word(self, word: 'Word') -> None:
         self.words.append(word)
         word.subscribed_to = self
 
     # ------------------------------ Align the words ----------------------------- #
 
-    def write_to_file(self) -> None:
-        with open(self.input_file, 'w+') as f:
-            if self.words:
-                for word in self.words[:-1]:
-                    line = fmt_input_word(word) + '\n'
-                    if line not in f.readlines():
-                        f.write(fmt_input_word(word) + '\n')
-
-                f.write(fmt_input_word(self.words[-1]))
-                # make sure that there aren't empty lines - empty lines are a waste of resources
-
-    async def m2m_aligner_output(self) -> str:
-        await m2m_aligner.m2m_aligner(
-            init=m2m_aligner.MODEL,
-            maxX=2,
-            maxY=2,
-            alignerIn=m2m_aligner.MODEL,
-            o=self.output_file,
-            i=self.input_file
-        )
-
-        return open(self.output_file, 'r')
-        
+    def align_from_lookup(self) -> list['Word']:
+        '''
+        Aligns the words that are in the lookup table, and returns the ones that aren't.
+        '''
+        if self.lookup is None:
+            return self.words
+
+        missing = []
+        # repeated words are only looked up once
+        results: dict[tuple[str, str], Optional[Processor.Output]] = {}
+
+        for word in self.words:
+            key = (word.long_form, word.pronunciation)
+
+            if key not in results:
+                results[key] = self.lookup.get(word)
+
+            if results[key] is None:
+                missing.append(word)
+            else:
+                word.alignments = results[key]
+
+        return missing
+
+    async def m2m_aligner_output(self, words: Optional[list['Word']] = None) -> list[Union[str, m2m_aligner.Unaligned]]:
+        '''
+        Aligns the words with the m2m-aligner, and returns its output lines once the whole batch is done.
+        '''
+        words = self.words if words is None else words
+        # each unique line is aligned once; align() fans the result out to every word
+        lines = list(dict.fromkeys(fmt_input_word(word) for word in words))
+
+        # a pool shares its aligner runs with every other request using it
+        pool = self.pool if self.pool is not None else m2m_aligner.default_pool()
+
+        return await pool.align(lines)
+
     # ---------------------------------------------------------------------------- #
 
+    @staticmethod
+    def index_words(words: list['Word']) -> dict[tuple[str, str], list['Word']]:
+        '''
+        Groups words by the key that their aligner output line will have.
+        '''
+        index = {}
+        for word in words:
+            index.setdefault(input_word_key(word), []).append(word)
+
+        return index
+
     async def align(self) -> None:
-        self.write_to_file()
-        output_file = await self.m2m_aligner_output()
+        # dictionary words don't need the aligner at all
+        if self.lookup is not None:
+            await self.lookup.ready()
 
-        deques: list[deque[int]] = []
+        words = self.align_from_lookup()
 
-        for line in output_file.readlines():
+        if not words:
+            return
 
-            deques = [deque(range(len(self.words)))]
+        index = self.index_words(words)
 
-            for idx in deques[0]:
-                word = self.words[idx]
-                
-                if output_line_is_word(word, line):
-                    word.alignments = postprocess(word, line)
-                
-                next_deque = deques[-1].copy()
-                next_deque.remove(idx)
-                deques.append(next_deque)
-            
-                del deques[0]
-        
-        del deques
+        for line in await self.m2m_aligner_output(words):
+            # words the aligner couldn't align are left for align_text() to fill in
+            if isinstance(line, m2m_aligner.Unaligned) or '\t' not in line:
+                continue
+
+            # each key only needs resolving once
+            matching_words = index.pop(output_line_key(line), None)
+
+            if not matching_words:
+                continue
+
+            # repeated words share one result
+            results: dict[str, Processor.Output] = {}
+            for word in matching_words:
+                if word.long_form not in results:
+                    results[word.long_form] = postprocess(word, line)
+
+                word.alignments = results[word.long_form]
 
 # ---------------------------------------------------------------------------- #
 
-async def align_text(text: str) -> list[Word]:
+async def align_text(text: str, pool: Optional[m2m_aligner.M2MAlignerPool] = None) -> list['Word']:
+    from src.aligner.word import Word
+
     words = Word.list_from_text(text)
     print(words)
 
-    aligner = WordGroupAligner()
+    aligner = WordGroupAligner(pool=pool)
 
     for word in words:
         if not word.is_expanded and not re.fullmatch(Word.punctuation_regex, word.long_form):
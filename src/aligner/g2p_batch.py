@@ -0,0 +1,95 @@
+from threading import RLock
+from typing import TYPE_CHECKING, Callable, Sequence
+
+if TYPE_CHECKING:
+    from Aquila_Resolve import G2p
+
+# ---------------------------------------------------------------------------- #
+#                             Batched G2P inference                            #
+# ---------------------------------------------------------------------------- #
+
+class BatchedInfer:
+    '''
+    Stands in for G2p.infer, so that the model can be run over many words at once.
+
+    G2p.convert asks the model about one word at a time. Words that were inferred
+    ahead of time with prefetch() are answered without running the model again,
+    until clear() is called. Other words are inferred, but not kept.
+    '''
+
+    def __init__(self, infer: Callable[[list[str]], list[str]]):
+        self.infer = infer
+        self.inferred: dict[str, str] = {}
+
+        # held for a whole batch, so that one batch can't clear another's words
+        self.lock = RLock()
+
+    def __call__(self, words: list[str]) -> list[str]:
+        with self.lock:
+            missing = [word for word in dict.fromkeys(words) if word not in self.inferred]
+            found = dict(zip(missing, self.infer(missing))) if missing else {}
+
+            return [found[word] if word in found else self.inferred[word] for word in words]
+
+    def prefetch(self, words: Sequence[str]) -> None:
+        '''
+        Runs the model once over all the words that haven't been inferred yet.
+        '''
+        with self.lock:
+            missing = [word for word in dict.fromkeys(words) if word not in self.inferred]
+
+            if missing:
+                self.inferred.update(zip(missing, self.infer(missing)))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.inferred.clear()
+
+def batched(g2p: 'G2p') -> BatchedInfer:
+    '''
+    Replaces a G2p's infer with a BatchedInfer, if it hasn't been already, and returns it.
+    '''
+    if not isinstance(g2p.infer, BatchedInfer):
+        g2p.infer = BatchedInfer(g2p.infer)
+
+    return g2p.infer
+
+def out_of_vocabulary_words(g2p: 'G2p', long_forms: Sequence[str]) -> list[str]:
+    '''
+    Returns the words in the long forms that neither of the G2p's dictionaries cover.
+    '''
+    # only needed along with a G2p, which imports them anyway
+    from Aquila_Resolve.filter import filter_text
+    from Aquila_Resolve.symbols import contains_alpha
+
+    words = []
+
+    for long_form in long_forms:
+        for word in g2p.h2p.tokenize(filter_text(long_form, preserve_case=True)):
+            if not contains_alpha(word) or g2p.h2p.dict.contains(word):
+                continue
+
+            # G2p.lookup lowercases words before looking them up and inferring them
+            word = word.lower()
+            if g2p.dict.get(word) is None:
+                words.append(word)
+
+    return words
+
+def convert_batch(g2p: 'G2p', long_forms: Sequence[str]) -> list[str]:
+    '''
+    Converts many long forms to pronunciations, running the model only once.
+
+    Some out-of-vocabulary words would have been resolved from their stems or plurals
+    without the model; inferring them anyway costs much less than a model call per word.
+    The inferred words are only kept for the batch.
+    '''
+    infer = batched(g2p)
+
+    with infer.lock:
+        try:
+            infer.prefetch(out_of_vocabulary_words(g2p, long_forms))
+
+            return [g2p.convert(long_form) for long_form in long_forms]
+        finally:
+            infer.clear()
@@ -0,0 +1,193 @@
+import atexit
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+from threading import RLock
+import time
+from typing import Callable, NamedTuple, Optional, Sequence, Union
+import weakref
+
+# ---------------------------------------------------------------------------- #
+#                           Pronunciation memoization                          #
+# ---------------------------------------------------------------------------- #
+
+CACHE_SIZE = 65536
+
+_MISSING = object()
+
+# the caches that are saved when the interpreter exits. They're only weakly
+# referenced, so that a cache that's no longer used can still be freed.
+_persistent_caches: 'weakref.WeakSet[G2pCache]' = weakref.WeakSet()
+
+@atexit.register
+def _save_persistent_caches() -> None:
+    for cache in list(_persistent_caches):
+        cache.save(cache.path)
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: Optional[int]
+    currsize: int
+
+class G2pCache:
+    '''
+    A bounded, thread-safe LRU cache around a G2P function, keyed by long form.
+    '''
+
+    def __init__(
+        self,
+        function: Callable[[str], str],
+        maxsize: Optional[int] = CACHE_SIZE,
+        ttl: Optional[float] = None,
+        path: Optional[Union[str, Path]] = None,
+        batch_function: Optional[Callable[[list[str]], list[str]]] = None
+    ):
+        '''
+        Instantiates a G2pCache object.
+
+        Args:
+            function: The G2P function to memoize.
+            maxsize: The most pronunciations to keep; the least recently used are evicted first. None is unbounded.
+            ttl: Seconds before a cached pronunciation expires. None never expires.
+            path: A JSON file to load the cache from now, and to save it to when the interpreter exits,
+                if the cache is still in use.
+            batch_function: Converts a list of long forms at once. Used by many() if given.
+        '''
+        self.function = function
+        self.batch_function = batch_function
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = Path(path) if path is not None else None
+
+        # long form -> (pronunciation, time cached)
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.path is not None:
+            if self.path.exists():
+                self.load(self.path)
+            _persistent_caches.add(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, long_form: str) -> bool:
+        with self._lock:
+            return self._get(long_form) is not _MISSING
+
+    def __call__(self, long_form: str) -> str:
+        with self._lock:
+            pronunciation = self._get(long_form)
+
+            if pronunciation is not _MISSING:
+                self.hits += 1
+                return pronunciation
+
+            self.misses += 1
+
+        # the model runs outside the lock, so other threads can keep hitting the cache
+        pronunciation = self.function(long_form)
+
+        self.put(long_form, pronunciation)
+
+        return pronunciation
+
+    def many(self, long_forms: Sequence[str]) -> list[str]:
+        '''
+        Looks up many long forms at once, converting all of the misses in a single batch.
+        '''
+        found: dict[str, str] = {}
+        missing: list[str] = []
+
+        with self._lock:
+            for long_form in dict.fromkeys(long_forms):
+                pronunciation = self._get(long_form)
+
+                if pronunciation is _MISSING:
+                    missing.append(long_form)
+                else:
+                    found[long_form] = pronunciation
+
+            self.hits += len(long_forms) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            if self.batch_function is not None:
+                pronunciations = self.batch_function(missing)
+            else:
+                pronunciations = [self.function(long_form) for long_form in missing]
+
+            for long_form, pronunciation in zip(missing, pronunciations):
+                self.put(long_form, pronunciation)
+                found[long_form] = pronunciation
+
+        return [found[long_form] for long_form in long_forms]
+
+    # ---------------------------------------------------------------------------- #
+
+    def _get(self, long_form: str):
+        entry = self._entries.get(long_form)
+
+        if entry is None:
+            return _MISSING
+
+        pronunciation, cached_at = entry
+
+        if self.ttl is not None and time.monotonic() - cached_at > self.ttl:
+            del self._entries[long_form]
+            return _MISSING
+
+        self._entries.move_to_end(long_form)
+
+        return pronunciation
+
+    def put(self, long_form: str, pronunciation: str) -> None:
+        with self._lock:
+            self._entries[long_form] = (pronunciation, time.monotonic())
+            self._entries.move_to_end(long_form)
+
+            while self.maxsize is not None and len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    # ---------------------------------------------------------------------------- #
+
+    def load(self, path: Union[str, Path]) -> None:
+        '''
+        Adds the pronunciations saved in a JSON file to the cache.
+        '''
+        with open(path, 'r', encoding='utf-8') as f:
+            pronunciations: dict[str, str] = json.load(f)
+
+        for long_form, pronunciation in pronunciations.items():
+            self.put(long_form, pronunciation)
+
+    def save(self, path: Union[str, Path]) -> None:
+        '''
+        Saves the cached pronunciations to a JSON file, from least to most recently used.
+        '''
+        with self._lock:
+            pronunciations = { long_form: entry[0] for long_form, entry in self._entries.items() }
+
+        # write to a temporary file first, so that a crash can't leave half a cache behind
+        tmp_path = Path(str(path) + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pronunciations, f)
+
+        os.replace(tmp_path, path)
@@ -0,0 +1,82 @@
+import asyncio
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Optional
+
+from src.aligner import m2m_aligner
+from src.aligner.process import Processor, input_word_key, output_line_key, postprocess
+
+if TYPE_CHECKING:
+    from src.aligner.word import Word
+
+# ---------------------------------------------------------------------------- #
+#                          Precomputed alignment lookup                        #
+# ---------------------------------------------------------------------------- #
+
+class AlignmentLookup:
+    '''
+    An in-process index of finished m2m-aligner output lines.
+
+    Words found in the index are aligned without running the m2m-aligner.
+    '''
+
+    def __init__(self, path: Path = m2m_aligner.ALIGNMENTS):
+        self.path = path
+        self._lines: Optional[dict[tuple[str, str], str]] = None
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __contains__(self, word: 'Word') -> bool:
+        return input_word_key(word) in self.lines
+
+    @property
+    def lines(self) -> dict[tuple[str, str], str]:
+        # the index is only read from disk the first time it's needed
+        if self._lines is None:
+            with self._lock:
+                if self._lines is None:
+                    self._lines = self.load(self.path)
+
+        return self._lines
+
+    def preload(self) -> None:
+        '''
+        Reads the index ahead of time, so that the first request doesn't pay for it.
+        '''
+        self.lines
+
+    async def ready(self) -> None:
+        '''
+        Reads the index in a worker thread if it hasn't been read yet, so that the event loop isn't blocked.
+        '''
+        if self._lines is None:
+            await asyncio.get_running_loop().run_in_executor(None, self.preload)
+
+    @staticmethod
+    def load(path: Path) -> dict[tuple[str, str], str]:
+        lines = {}
+
+        with open(path, 'r') as f:
+            for line in f:
+                if '\t' not in line:
+                    continue
+
+                # keep the first alignment if a pair is listed more than once
+                lines.setdefault(output_line_key(line), line if line.endswith('\n') else line + '\n')
+
+        return lines
+
+    def get(self, word: 'Word') -> Optional[Processor.Output]:
+        '''
+        Returns the alignments for a word, or None if the word isn't in the index.
+        '''
+        line = self.lines.get(input_word_key(word))
+
+        if line is None:
+            return None
+
+        return postprocess(word, line)
+
+cmudict_lookup = AlignmentLookup()
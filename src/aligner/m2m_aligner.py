@@ -1,24 +1,52 @@
+import asyncio
+from dataclasses import dataclass, field
+import os
 from pathlib import Path
 import subprocess
+from typing import AsyncIterator, NamedTuple, Optional, Union
+from weakref import WeakKeyDictionary
 
-from tests.configure_logger import configure_logger
+from src.aligner.process import output_line_key
+from src.logger import library_logger
 
 
 CONTAINER_DIR = Path(__file__).parent.parent.parent / 'aligner'
 ALIGNER_DIR = CONTAINER_DIR / 'm2m-aligner'
 EXECUTABLE = ALIGNER_DIR / 'm2m-aligner'
 MODEL = CONTAINER_DIR / 'model/cmudict.txt.m-mAlign.2-2.delX.1-best.conYX.align.model'
-VAR_DIR = CONTAINER_DIR / 'var'
+ALIGNMENTS = CONTAINER_DIR / 'model/cmudict.txt.m-mAlign.2-2.delX.1-best.conYX.align'
 
-logger = configure_logger('m2m-aligner')
+# the arguments used for aligning words against the pretrained model
+ALIGNER_ARGS = dict(init=MODEL, maxX=2, maxY=2, alignerIn=MODEL)
 
-async def m2m_aligner(**kwargs) -> None:
-    """
-    Runs the M2M aligner with the provided arguments.
-    
-    Parameters:
-        kwargs (dict): A dictionary of arguments to be passed to the M2M aligner.
-    """
+# pool defaults
+WORKERS = min(4, os.cpu_count() or 1)
+MAX_BATCH_SIZE = 4096
+MAX_RESTARTS = 3
+RESTART_DELAY = 0.1
+TIMEOUT = 60.0
+
+logger = library_logger('m2m-aligner')
+
+class M2MAlignerError(Exception):
+    '''
+    Raised when the m2m-aligner exits unsuccessfully.
+    '''
+
+class Unaligned(NamedTuple):
+    '''
+    An input line that the m2m-aligner couldn't align.
+
+    The aligner writes these to <output file>.err, which can't be made next to a
+    pipe, so they're found by checking which input lines have no output instead.
+    '''
+    line: str
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return tuple(self.line.split('\t'))
+
+async def _spawn(kwargs: dict, stdin=subprocess.DEVNULL, **popen_kwargs) -> tuple[asyncio.subprocess.Process, list]:
     args = []
     for key, value in kwargs.items():
         args.append(('-' if key in ['i', 'o'] else '--') + key)
@@ -30,11 +58,350 @@ async def m2m_aligner(**kwargs) -> None:
         *args
     ]
 
-    result = subprocess.run(cmd, cwd=CONTAINER_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=CONTAINER_DIR,
+        stdin=stdin,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        **popen_kwargs
+    )
+
+    return process, cmd
+
+async def _kill(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is None:
+        process.kill()
+        # shielded, so that a second cancellation can't leave a zombie behind
+        await asyncio.shield(process.wait())
+
+async def _wait_until(awaitable, deadline: Optional[float], timeout: Optional[float]):
+    remaining = None if deadline is None else max(0, deadline - asyncio.get_running_loop().time())
+
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        raise M2MAlignerError(f'm2m-aligner timed out after {timeout}s')
 
-    if result == 1:
-        logger.error('\n'+result.stderr.decode('utf-8'))
+def _log_result(result: subprocess.CompletedProcess) -> None:
+    if result.returncode != 0:
+        logger.error('\n%s', result.stderr.decode('utf-8'))
     else:
-        logger.info('\n'+result.stdout.decode('utf-8'))
+        logger.info('\n%s', result.stdout.decode('utf-8'))
+
+async def stream_lines(lines: list[str], timeout: Optional[float] = TIMEOUT, **kwargs) -> AsyncIterator[Union[str, Unaligned]]:
+    '''
+    Aligns a batch of formatted input lines in a single run of the M2M aligner,
+    yielding each output line as soon as the aligner writes it.
+
+    The input lines are written to the aligner's stdin, and its output file is a pipe,
+    so nothing touches the disk. Once the aligner is done, an Unaligned entry is
+    yielded for each input line that it didn't align.
+
+    Args:
+        lines: Lines formatted with fmt_input_word.
+        timeout: Seconds to wait for the whole run before giving up.
+        kwargs: Arguments for the M2M aligner, other than the input and output files.
+
+    Raises:
+        M2MAlignerError: If the aligner times out or exits unsuccessfully.
+    '''
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+
+    read_fd, write_fd = os.pipe()
+    try:
+        process, cmd = await _spawn(
+            { **(kwargs or ALIGNER_ARGS), 'o': f'/dev/fd/{write_fd}', 'i': '/dev/stdin' },
+            stdin=subprocess.PIPE,
+            pass_fds=(write_fd,)
+        )
+    except BaseException:
+        os.close(read_fd)
+        raise
+    finally:
+        # the aligner holds the only write end now, so we'll see EOF when it exits
+        os.close(write_fd)
+
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader),
+        open(read_fd, 'rb', buffering=0)
+    )
+    communicate = asyncio.ensure_future(process.communicate('\n'.join(lines).encode('utf-8')))
+
+    # the input lines that haven't been aligned yet, by key
+    pending = { tuple(line.split('\t')): line for line in lines }
+
+    try:
+        while line := await _wait_until(reader.readline(), deadline, timeout):
+            line = line.decode('utf-8')
+
+            if '\t' in line:
+                pending.pop(output_line_key(line), None)
+
+            yield line
+
+        stdout, stderr = await _wait_until(communicate, deadline, timeout)
+    except BaseException:
+        communicate.cancel()
+        await _kill(process)
+        raise
+    finally:
+        transport.close()
+
+    result = subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+    _log_result(result)
+
+    if result.returncode != 0:
+        raise M2MAlignerError(result.stderr.decode('utf-8'))
+
+    for line in pending.values():
+        logger.warning('m2m-aligner could not align %r', line)
+        yield Unaligned(line)
+
+async def align_lines(lines: list[str], timeout: Optional[float] = TIMEOUT, **kwargs) -> list[Union[str, Unaligned]]:
+    '''
+    Aligns a batch of formatted input lines in a single run of the M2M aligner.
+
+    Args:
+        lines: Lines formatted with fmt_input_word.
+        timeout: Seconds to wait for the aligner before giving up.
+        kwargs: Arguments for the M2M aligner, other than the input and output files.
+
+    Returns:
+        list[Union[str, Unaligned]]: The aligner's output lines, followed by the input lines it couldn't align.
+    '''
+    return [line async for line in stream_lines(lines, timeout=timeout, **kwargs)]
+
+# ---------------------------------------------------------------------------- #
+#                                  Worker pool                                 #
+# ---------------------------------------------------------------------------- #
+
+@dataclass
+class AlignerJob:
+    lines: list[str]
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+    @property
+    def keys(self) -> set[tuple[str, str]]:
+        return { tuple(line.split('\t')) for line in self.lines }
+
+class M2MAlignerPool:
+    '''
+    A supervised pool of workers that feed batches of input lines to the M2M aligner.
+
+    The aligner reads its model and the whole of its input before it writes any
+    output, so a worker can't keep one process alive between requests. Instead,
+    requests that queue up while the workers are busy are merged into a single
+    batch, and the model is loaded once per batch instead of once per request.
+    '''
+
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_restarts: int = MAX_RESTARTS,
+        restart_delay: float = RESTART_DELAY,
+        timeout: Optional[float] = TIMEOUT,
+        **aligner_kwargs
+    ):
+        '''
+        Instantiates an M2MAlignerPool object. The workers are started on first use.
+
+        Args:
+            workers: The number of batches that may be aligned at once.
+            max_batch_size: The maximum number of lines in a single batch.
+            max_restarts: How many times a failed batch is retried, and how many times in
+                a row a crashed worker is restarted, before giving up.
+            restart_delay: The delay before the first retry; it doubles for each retry after.
+            timeout: Seconds to wait for a single aligner run before retrying it.
+            aligner_kwargs: Arguments for the M2M aligner. Defaults to ALIGNER_ARGS.
+        '''
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, not {workers}")
+
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.max_restarts = max_restarts
+        self.restart_delay = restart_delay
+        self.timeout = timeout
+        self.aligner_kwargs = aligner_kwargs or ALIGNER_ARGS
+
+        self._queue: Optional[asyncio.Queue[AlignerJob]] = None
+        self._tasks: list[asyncio.Task] = []
+        self._crashes: list[int] = [0] * workers
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self) -> None:
+        if self.running:
+            return
+
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+
+        self._tasks = [
+            asyncio.get_running_loop().create_task(self._supervise(n))
+            for n in range(self.workers)
+        ]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # nobody is left to answer the jobs that are still waiting
+        self._fail_queued(asyncio.CancelledError())
+
+    async def __aenter__(self) -> 'M2MAlignerPool':
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    # ---------------------------------------------------------------------------- #
+
+    async def align(self, lines: list[str]) -> list[Union[str, Unaligned]]:
+        '''
+        Aligns formatted input lines, sharing an aligner run with any other queued requests.
+
+        Args:
+            lines: Lines formatted with fmt_input_word.
+
+        Returns:
+            list[Union[str, Unaligned]]: The aligner's output lines for these input lines,
+                followed by the input lines it couldn't align.
+        '''
+        if not lines:
+            return []
+
+        self.start()
+
+        job = AlignerJob(lines)
+        await self._queue.put(job)
+
+        return await job.future
+
+    # ---------------------------------------------------------------------------- #
+
+    async def _supervise(self, worker_id: int) -> None:
+        self._crashes[worker_id] = 0
+
+        while True:
+            try:
+                await self._work(worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._crashes[worker_id] += 1
+                crashes = self._crashes[worker_id]
+
+                logger.exception('aligner worker #%d crashed (%d/%d)', worker_id, crashes, self.max_restarts)
+
+                if crashes > self.max_restarts:
+                    current = asyncio.current_task()
+
+                    # if this was the last worker, the queued jobs would wait forever
+                    if not any(not task.done() for task in self._tasks if task is not current):
+                        self._fail_queued(e)
+
+                    raise
+
+                await asyncio.sleep(self.restart_delay * 2 ** (crashes - 1))
+
+    async def _work(self, worker_id: int) -> None:
+        while True:
+            jobs = [await self._queue.get()]
+            size = len(jobs[0].lines)
+
+            # take everything else that's waiting, up to the batch size
+            while not self._queue.empty() and size < self.max_batch_size:
+                job = self._queue.get_nowait()
+                jobs.append(job)
+                size += len(job.lines)
+
+            try:
+                await self._run_batch(jobs)
+                self._crashes[worker_id] = 0
+            except (M2MAlignerError, OSError) as e:
+                # the batch has run out of retries; the worker itself is fine
+                self._fail(jobs, e)
+            except BaseException as e:
+                self._fail(jobs, e)
+                raise
+
+    def _fail_queued(self, e: BaseException) -> None:
+        while self._queue and not self._queue.empty():
+            self._fail([self._queue.get_nowait()], e)
+
+    @staticmethod
+    def _fail(jobs: list[AlignerJob], e: BaseException) -> None:
+        for job in jobs:
+            if job.future.done():
+                continue
+
+            if isinstance(e, asyncio.CancelledError):
+                job.future.cancel()
+            else:
+                job.future.set_exception(e)
+
+    async def _run_batch(self, jobs: list[AlignerJob]) -> None:
+        # requests often share words, and each one only needs aligning once
+        lines = list(dict.fromkeys(line for job in jobs for line in job.lines))
+
+        for attempt in range(self.max_restarts + 1):
+            try:
+                output = await align_lines(lines, timeout=self.timeout, **self.aligner_kwargs)
+                break
+            except (M2MAlignerError, OSError) as e:
+                if attempt == self.max_restarts:
+                    raise
+
+                logger.warning('aligner run failed, retrying (%d/%d): %s', attempt + 1, self.max_restarts, e)
+                await asyncio.sleep(self.restart_delay * 2 ** attempt)
+
+        # hand each job back only the output lines that belong to it
+        results = [[] for _ in jobs]
+
+        results_by_key: dict[tuple[str, str], list[list[str]]] = {}
+        for job, result in zip(jobs, results):
+            for key in job.keys:
+                results_by_key.setdefault(key, []).append(result)
+
+        for line in output:
+            if isinstance(line, Unaligned):
+                key = line.key
+            elif '\t' in line:
+                key = output_line_key(line)
+            else:
+                continue
+
+            for result in results_by_key.get(key, ()):
+                result.append(line)
+
+        for job, result in zip(jobs, results):
+            if not job.future.done():
+                job.future.set_result(result)
+
+_pools: 'WeakKeyDictionary[asyncio.AbstractEventLoop, M2MAlignerPool]' = WeakKeyDictionary()
+
+def default_pool() -> M2MAlignerPool:
+    '''
+    Returns the shared pool for the running event loop, creating it if needed.
+    '''
+    loop = asyncio.get_running_loop()
+
+    # a pool's workers refer to their loop, so the pools of closed loops are dropped here
+    for closed in [l for l in _pools if l.is_closed()]:
+        del _pools[closed]
+
+    if loop not in _pools:
+        _pools[loop] = M2MAlignerPool()
 
-    return result
\ No newline at end of file
+    return _pools[loop]
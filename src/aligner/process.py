@@ -1,8 +1,9 @@
 import re
+from typing import TYPE_CHECKING
 
-from Aquila_Resolve.text import numbers
-
-from src.aligner.word import Word
+# only for annotations, so that the formatting helpers don't load the G2P model
+if TYPE_CHECKING:
+    from src.aligner.word import Word
 
 # ---------------------------------------------------------------------------- #
 #                               Type definitions                               #
@@ -46,21 +47,31 @@ def fmt_phonemes(phonemes: str) -> str:
 
     return phonemes
 
-def fmt_input_word(word: Word) -> str:
+def fmt_input_word(word: 'Word') -> str:
     return fmt_graphemes(word.long_form) + '\t' + fmt_phonemes(word.pronunciation)
 
+def input_word_key(word: 'Word') -> tuple[str, str]:
+    return fmt_graphemes(word.long_form), fmt_phonemes(word.pronunciation)
+
+
+null_re = re.compile(r'(?:^|\s)_(?=\s|$)')
 
 def remove_bars_colons(text: str) -> str:
     return re.sub(r'[\|:]', ' ', text).rstrip()
 
-def output_line_is_word(word: Word, output_line: str) -> bool:
-    # assuming that the words are formatted
-    graphemes, phonemes = output_line.split('\t')
+def remove_nulls(text: str) -> str:
+    # the aligner pads deletions with '_', which never appears in the input
+    return re.sub(null_re, '', text).strip()
+
+def output_line_key(output_line: str) -> tuple[str, str]:
+    # the same shape as input_word_key, so that output lines can be looked up by word
+    graphemes, phonemes = output_line.rstrip('\n').split('\t')[:2]
 
-    graphemes_match = fmt_graphemes(word.long_form) == remove_bars_colons(graphemes)
-    phonemes_match = fmt_phonemes(word.pronunciation) == remove_bars_colons(phonemes)
+    return remove_nulls(remove_bars_colons(graphemes)), remove_nulls(remove_bars_colons(phonemes))
 
-    return graphemes_match and phonemes_match
+def output_line_is_word(word: 'Word', output_line: str) -> bool:
+    # assuming that the words are formatted
+    return input_word_key(word) == output_line_key(output_line)
 
 # ---------------------------------------------------------------------------- #
 #                           Post-processing utilities                          #
@@ -72,7 +83,7 @@ punctuation_letter_cluster_re = re.compile(r'[^\w]*\w')
 def split_word_into_punctuation_letter_clusters(word_long_form: str) -> list[str]:
     return re.findall(punctuation_letter_cluster_re, word_long_form)
 
-def re_add_disallowed_m2m_aligner_characters(word: Word, grapheme_line: str) -> str:
+def re_add_disallowed_m2m_aligner_characters(word: 'Word', grapheme_line: str) -> str:
     fixed_output = re.findall(split_grapheme_line_re, grapheme_line)
 
     position_of_tab = fixed_output.index('\t')
@@ -92,7 +103,7 @@ def split_aligner_output(aligned_data: str) -> Processor.Output:
     return data_split
 
 
-def postprocess(word: Word, aligner_line: str) -> Processor.Output:
+def postprocess(word: 'Word', aligner_line: str) -> Processor.Output:
     aligner_line = re_add_disallowed_m2m_aligner_characters(word, aligner_line[:-1])
     aligner_output = split_aligner_output(aligner_line)[0]
 
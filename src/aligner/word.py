@@ -1,11 +1,65 @@
 from dataclasses import dataclass, field
 import re
-from typing import Callable
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Optional, Sequence
 
 from Aquila_Resolve.text import numbers
-from Aquila_Resolve import G2p
 
-aquila_resolve_g2p = G2p()
+from src.aligner.g2p_batch import convert_batch
+from src.aligner.g2p_cache import G2pCache
+
+if TYPE_CHECKING:
+    from Aquila_Resolve import G2p
+
+# ---------------------------------------------------------------------------- #
+#                                   G2P model                                  #
+# ---------------------------------------------------------------------------- #
+
+# the model takes seconds to load, so it isn't loaded until it's first needed
+_aquila_resolve_g2p: Optional['G2p'] = None
+_aquila_resolve_g2p_lock = Lock()
+
+def get_g2p() -> 'G2p':
+    '''
+    Returns the shared G2p model, loading it on first use.
+    '''
+    global _aquila_resolve_g2p
+
+    if _aquila_resolve_g2p is None:
+        with _aquila_resolve_g2p_lock:
+            if _aquila_resolve_g2p is None:
+                from Aquila_Resolve import G2p
+                _aquila_resolve_g2p = G2p()
+
+    return _aquila_resolve_g2p
+
+def preload(warmup: bool = True) -> None:
+    '''
+    Loads the G2p model ahead of time, so that the first request doesn't pay for it.
+
+    Args:
+        warmup: Also run a conversion, which loads the model's lazily loaded parts.
+    '''
+    g2p = get_g2p()
+
+    if warmup:
+        g2p.convert('warm up')
+
+def __getattr__(name: str):
+    # aquila_resolve_g2p used to be loaded when this module was imported
+    if name == 'aquila_resolve_g2p':
+        return get_g2p()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def g2p_convert(long_form: str) -> str:
+    return get_g2p().convert(long_form)
+
+def g2p_convert_batch(long_forms: Sequence[str]) -> list[str]:
+    return convert_batch(get_g2p(), long_forms)
+
+# pronunciations are memoized by long form, since the same words keep coming up
+cached_g2p = G2pCache(g2p_convert, batch_function=g2p_convert_batch)
 
 # ---------------------------------------------------------------------------- #
 #                                  Word class                                  #
@@ -21,10 +75,10 @@ def _combine_regexes(*regexes: list[re.Pattern]) -> re.Pattern:
 @dataclass
 class Word:
     short_form: str
-    long_form: str = field(init=False)
-    pronunciation: str = field(init=False)
+    long_form: Optional[str] = field(default=None, kw_only=True)
+    pronunciation: Optional[str] = field(default=None, kw_only=True)
 
-    g2p_function: Callable[[str], str] = field(repr=False, default=aquila_resolve_g2p.convert)
+    g2p_function: Callable[[str], str] = field(repr=False, default=cached_g2p)
     normalize_numbers_function: Callable[[str], str] = field(repr=False, default=numbers.normalize_numbers)
 
     alignments: str = field(init=False, default=None)
@@ -43,8 +97,13 @@ class Word:
     )
 
     def __post_init__(self):
-        self.long_form = self.normalize_numbers_function(self.short_form)
-        self.pronunciation = self.g2p_function(self.long_form)
+        # the long form may have been worked out already, in a batch
+        if self.long_form is None:
+            self.long_form = self.normalize_numbers_function(self.short_form)
+
+        # the pronunciation may have been worked out already, in a batch
+        if self.pronunciation is None:
+            self.pronunciation = self.g2p_function(self.long_form)
 
         self.subscribed_to: 'Aligner' = None
 
@@ -72,8 +131,32 @@ class Word:
         return result
 
     @staticmethod
-    def list_from_text(text_line: str) -> list['Word']:
-        if text_line == '':
-            return []
-        
-        return [Word(word) for word in Word.separate_unexpanded_symbols(text_line)]
+    def list_from_text(
+        text_line: str,
+        g2p_batch_function: Callable[[Sequence[str]], list[str]] = cached_g2p.many
+    ) -> list['Word']:
+        return Word.lists_from_texts([text_line], g2p_batch_function)[0]
+
+    @staticmethod
+    def lists_from_texts(
+        text_lines: Sequence[str],
+        g2p_batch_function: Callable[[Sequence[str]], list[str]] = cached_g2p.many
+    ) -> list[list['Word']]:
+        '''
+        Splits each line of text into words, converting every word to phonemes in one batch.
+        '''
+        short_forms = [
+            Word.separate_unexpanded_symbols(text_line) if text_line != '' else []
+            for text_line in text_lines
+        ]
+
+        all_short_forms = [short_form for line in short_forms for short_form in line]
+        long_forms = [numbers.normalize_numbers(short_form) for short_form in all_short_forms]
+
+        pronunciations = iter(g2p_batch_function(long_forms))
+        long_forms = iter(long_forms)
+
+        return [
+            [Word(short_form, long_form=next(long_forms), pronunciation=next(pronunciations)) for short_form in line]
+            for line in short_forms
+        ]
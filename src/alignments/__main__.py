@@ -0,0 +1,47 @@
+import argparse
+import asyncio
+from typing import Optional, Sequence
+
+from src.alignments.alignments import Alignments
+from src.logger import configure_logger
+
+# ---------------------------------------------------------------------------- #
+#                                 Command line                                 #
+# ---------------------------------------------------------------------------- #
+
+def align(text: str) -> None:
+    print(asyncio.run(Alignments.alignments_from_text(text)))
+
+def repl() -> None:
+    print('oh hello there. enter a phrase to align, or ".exit" to quit.')
+    while True:
+        uinput = input('>>> ')
+        if uinput == ".exit":
+            break
+        else:
+            align(uinput)
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m src.alignments',
+        description='Aligns the graphemes and phonemes of a phrase.'
+    )
+    parser.add_argument('text', nargs='*', help='the phrase to align. Starts a prompt if left out.')
+    parser.add_argument('--debug', action='store_true', help='log every binding that is made')
+    parser.add_argument('--sample', type=float, metavar='RATE', help='with --debug, only log this fraction of the bindings')
+
+    args = parser.parse_args(argv)
+
+    if args.sample is not None and not args.debug:
+        parser.error('--sample only applies with --debug')
+
+    if args.debug:
+        configure_logger('bindings', sample_rate=args.sample)
+
+    if args.text:
+        align(' '.join(args.text))
+    else:
+        repl()
+
+if __name__ == '__main__':
+    main()
@@ -1,37 +1,162 @@
-import asyncio
-from copy import deepcopy
-from functools import reduce
+from array import array
 import itertools
-from typing import List, Mapping, Optional, Sequence, Tuple, TypeAlias, Union
+import logging
+from typing import TYPE_CHECKING, Iterable, List, Mapping, Optional, Sequence, Tuple, TypeAlias, Union
+import weakref
 
-from src.aligner.aligner import align_text
-from src.aligner.word import Word
-from src.class_register import IndexedClass, indexed
-from tests.configure_logger import configure_logger
+from src.alignments.csr import CSRMatrix
+from src.class_register import IndexedClass, Registry, current_registry, indexed, registry_scope
+from src.logger import library_logger
 
-bindings_logger = configure_logger("bindings")
+# the aligner pulls in the G2P model, so it's only imported when text is aligned
+if TYPE_CHECKING:
+    from src.aligner.m2m_aligner import M2MAlignerPool
+    from src.aligner.word import Word
+
+bindings_logger = library_logger("bindings")
 
 class Node(IndexedClass['Node']):
     '''
     A single node in a layer.
+
+    The node's data is interned in its registry's symbol table, and only the
+    symbol is kept on the node.
     '''
+    __slots__ = ('symbol', 'layer')
 
     @indexed
     def __init__(self, data) -> None:
         self.data = data
         self.layer: Optional['Layer'] = None
 
+    @classmethod
+    def view(cls, registry: Registry, id: int, symbol: int, layer: Optional['Layer']) -> 'Node':
+        '''
+        Creates a node for an ID that has already been reserved, without registering it again.
+        '''
+        node = cls.__new__(cls)
+
+        node.id = id
+        node.registry = registry
+        node.symbol = symbol
+        node.layer = layer
+
+        return node
+
+    @property
+    def data(self):
+        return self.registry.symbols[self.symbol]
+
+    @data.setter
+    def data(self, data) -> None:
+        self.symbol = self.registry.symbols.intern(data)
+
+        try:
+            layer = self.layer
+        except AttributeError:
+            # the node is being created, so no layer has seen it yet
+            return
+
+        # any other layers that the node is in don't know about it, so they check
+        # their nodes again when the version changes
+        self.registry.data_version += 1
+
+        position = layer.position(self.id) if layer is not None else None
+
+        # the layer may have dropped the node since
+        if position is not None:
+            layer.symbols[position] = self.symbol
+
     def __repr__(self):
         return f'Node(data={self.data}, layer_id={self.id})'
 
+class NodeList(list):
+    '''
+    The nodes of a layer, which can't be changed directly, since the layer keeps
+    columns of their IDs and data. Use the layer's methods to change them instead.
+    '''
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("a layer's nodes can't be changed directly; use Layer.append(), extend(), insert() or set()")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
 class Layer(IndexedClass['Layer']):
     '''
     A layer of nodes.
+
+    The layer is stored as two columns: the IDs of its nodes, and the symbols of
+    their data. Layers made with from_data() only create Node objects when they
+    are looked up.
+
+    A node only updates the symbols of the first layer it was added to. When the
+    data of any node in the registry is reassigned, the other layers copy the
+    symbols from their nodes again before they're next read.
+
+    ordinal is the layer's number within the Alignments it was last added to.
     '''
+    __slots__ = ('ids', 'symbols', 'bindings', 'ordinal', '_nodes', '_span', '_positions', '_data_index', '_data_version')
+
     @indexed
     def __init__(self, nodes: List[Node]):
         self.nodes = nodes
         self.bindings: Optional[Bindings] = None
+        self.ordinal: Optional[int] = None
+
+    @classmethod
+    def from_data(cls, data: Sequence) -> 'Layer':
+        '''
+        Creates a layer with a node for each value, reserving the node IDs in one contiguous range.
+
+        Args:
+            data: The data of each node.
+
+        Returns:
+            Layer: The new layer.
+        '''
+        layer = cls([])
+        registry = layer.registry
+
+        symbols = array('i', map(registry.symbols.intern, data))
+        layer_ref = weakref.ref(layer)
+
+        def node_view(node_id: int) -> Node:
+            return Node.view(registry, node_id, symbols[node_id - span.start], layer_ref())
+
+        span = registry.reserve(Node.__name__, len(symbols), node_view)
+
+        layer.ids = array('i', span)
+        layer.symbols = symbols
+        layer._nodes = None
+        layer._span = span
+        layer._positions = None
+        layer._data_index = None
+        layer._data_version = registry.data_version
+
+        return layer
+
+    @property
+    def nodes(self) -> NodeList:
+        if self._nodes is None:
+            self._nodes = NodeList(Node.ids(self.ids, self.registry))
+
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes: List[Node]) -> None:
+        nodes = NodeList(nodes)
+        self._check_registry(nodes)
+
+        self._nodes = nodes
+        self._span = None
+        self._positions = None
+        self._data_index = None
+        self._data_version = self.registry.data_version
+
+        self.ids = array('i', (node.id for node in nodes))
+        self.symbols = array('i', (node.symbol for node in nodes))
 
     def __repr__(self):
         return f'Layer(nodes={self.nodes}, id={self.id})'
@@ -42,22 +167,159 @@ class Layer(IndexedClass['Layer']):
 
     # ---------------------------------------------------------------------------- #
 
+    def values(self) -> List:
+        '''
+        Returns the data of every node in the layer, without creating any Node objects.
+        '''
+        self._refresh()
+
+        symbols = self.registry.symbols
+        return [symbols[symbol] for symbol in self.symbols]
+
+    def position(self, node_id: int) -> Optional[int]:
+        '''
+        Returns the position of a node in the layer, or None if the node isn't in it.
+        '''
+        if self._span is not None:
+            return node_id - self._span.start if node_id in self._span else None
+
+        if self._positions is None:
+            positions = self._positions = {}
+
+            for i, id in enumerate(self.ids):
+                positions.setdefault(id, i)
+
+        return self._positions.get(node_id)
+
+    def contains_id(self, node_id: int) -> bool:
+        '''
+        Checks whether a node is in the layer, without creating any Node objects.
+        '''
+        return self.position(node_id) is not None
+
+    def positions_of(self, value) -> List[int]:
+        '''
+        Returns the positions of the nodes whose data equals the value, in layer order.
+
+        The nodes are indexed by the symbols of their data, so a value is looked up
+        in the symbol table instead of being compared with each node.
+        '''
+        self._refresh()
+
+        if self._data_index is None:
+            self._data_index = ({}, set())
+            self._index_data(0)
+
+        index, unhashable = self._data_index
+        symbols = self.registry.symbols
+
+        try:
+            hash(value)
+        except TypeError:
+            # an unhashable value can only be compared with each node
+            values = self.values()
+            return [i for i, data in enumerate(values) if data == value]
+
+        groups = [index[code] for code in symbols.codes_equal_to(value) if code in index]
+        groups.extend([i for i in index[code] if symbols[code] == value] for code in unhashable)
+        groups = [group for group in groups if group]
+
+        if len(groups) == 1:
+            return list(groups[0])
+
+        return sorted(itertools.chain.from_iterable(groups))
+
+    def _index_data(self, start: int) -> None:
+        # adds the nodes from {start} onwards to the data index
+        index, unhashable = self._data_index
+        symbols = self.registry.symbols
+
+        for i in range(start, len(self.symbols)):
+            code = self.symbols[i]
+            positions = index.get(code)
+
+            if positions is None:
+                positions = index[code] = []
+
+                # unhashable values aren't in the symbol table's index
+                if symbols.code(symbols[code]) is None:
+                    unhashable.add(code)
+
+            positions.append(i)
+
+    def _refresh(self) -> None:
+        # nodes only update the symbols of their own layer, so after any reassignment,
+        # the symbols are copied from the nodes again
+        version = self.registry.data_version
+
+        if self._data_version == version:
+            return
+
+        if self._nodes is not None:
+            for i, node in enumerate(self._nodes):
+                if self.symbols[i] != node.symbol:
+                    self.symbols[i] = node.symbol
+
+        self._data_index = None
+        self._data_version = version
+
+    def _index_appended(self, start: int) -> None:
+        # keeps the indexes up to date after nodes are added at the end
+        self._span = None
+
+        if self._positions is not None:
+            for i in range(start, len(self.ids)):
+                self._positions.setdefault(self.ids[i], i)
+
+        if self._data_index is not None:
+            self._index_data(start)
+
+    def _check_registry(self, nodes: Sequence[Node]) -> None:
+        # node IDs and symbols only mean something in the registry they came from
+        for node in nodes:
+            if node.registry is not self.registry:
+                raise ValueError(f"{node} is from a different registry than Layer #{self.id}")
+
     def set_this_layer_for_all_nodes(self):
-        for node in self.nodes:
+        # nodes that haven't been created yet get their layer when they are
+        if self._nodes is None:
+            return
+
+        self._adopt(self._nodes)
+
+    def _adopt(self, nodes: Sequence[Node]) -> None:
+        for node in nodes:
             if not node.layer:
                 node.layer = self
 
     def append(self, node: Node):
-        self.nodes.append(node)
-        self.set_this_layer_for_all_nodes()
+        self._check_registry((node,))
+        list.append(self.nodes, node)
+        self.ids.append(node.id)
+        self.symbols.append(node.symbol)
+        self._index_appended(len(self.ids) - 1)
+        self._adopt((node,))
 
     def extend(self, nodes: List[Node]):
-        self.nodes.extend(nodes)
-        self.set_this_layer_for_all_nodes()
+        nodes = list(nodes)
+        self._check_registry(nodes)
+        start = len(self.ids)
+        list.extend(self.nodes, nodes)
+        self.ids.extend(node.id for node in nodes)
+        self.symbols.extend(node.symbol for node in nodes)
+        self._index_appended(start)
+        self._adopt(nodes)
 
     def insert(self, id, *nodes: List[Node]):
-        self.nodes[id:id] = nodes
-        self.set_this_layer_for_all_nodes()
+        self._check_registry(nodes)
+        list.__setitem__(self.nodes, slice(id, id), nodes)
+        self.ids[id:id] = array('i', (node.id for node in nodes))
+        self.symbols[id:id] = array('i', (node.symbol for node in nodes))
+        # the nodes after the insertion have moved, so the index is rebuilt when it's next needed
+        self._span = None
+        self._positions = None
+        self._data_index = None
+        self._adopt(nodes)
 
     def set(self, nodes: List[Node]):
         self.nodes = nodes
@@ -65,13 +327,57 @@ class Layer(IndexedClass['Layer']):
     
 # ---------------------------------------------------------------------------- #
 
+class PaddedBindings(Mapping[int, List[int]]):
+    '''
+    A read-only view of a dictionary of bindings, in which unbound nodes in a layer are bound to nothing.
+
+    Bound nodes come first, in the order they were bound, followed by the unbound nodes in layer order.
+    The lists are the ones the bindings are stored in, so they mustn't be modified.
+    '''
+    __slots__ = ('bindings', 'layer')
+
+    def __init__(self, bindings: 'Bindings.Dictionary', layer: Layer):
+        self.bindings = bindings
+        self.layer = layer
+
+    def __getitem__(self, node_id: int) -> List[int]:
+        outputs = self.bindings.get(node_id)
+
+        if outputs is not None:
+            return outputs
+        if self.layer.contains_id(node_id):
+            return []
+
+        raise KeyError(node_id)
+
+    def __contains__(self, node_id) -> bool:
+        return node_id in self.bindings or self.layer.contains_id(node_id)
+
+    def __iter__(self):
+        yield from self.bindings
+
+        for node_id in self.layer.ids:
+            if node_id not in self.bindings:
+                yield node_id
+
+    def __len__(self) -> int:
+        return len(self.bindings) + sum(1 for node_id in self.layer.ids if node_id not in self.bindings)
+
+# versions are unique across all bindings, so that replacing a layer's bindings changes its version too
+_binding_versions = itertools.count(1)
+
 class Bindings:
     '''
     The links between a layer, and the layers directly above and below it.
+
+    version changes whenever a binding is added, so that anything built from the
+    bindings can tell when it's out of date.
     '''
     Dictionary: TypeAlias = Mapping[int, List[int]]
     Ungrouped: TypeAlias = List[Tuple[int, int]]
 
+    __slots__ = ('anchor', 'layer_above', 'layer_below', 'bindings_up', 'bindings_down', 'version')
+
     def __init__(self, anchor: Layer, layer_above: Optional[Layer] = None, layer_below: Optional[Layer] = None):
         '''
         Instantiates a Bindings object.
@@ -91,12 +397,15 @@ class Bindings:
         self.bindings_up = {}
         self.bindings_down = {}
 
+        self.version = next(_binding_versions)
+
     def __str__(self):
+        registry = self.anchor.registry
         str_ = ''
         for k1, vv1 in self.bindings_up.items():
-            str_ += f"up: [{', '.join(str(Node.id(v)) for v in vv1)}] <- {Node.id(k1)}\n"
+            str_ += f"up: [{', '.join(str(Node.id(v, registry)) for v in vv1)}] <- {Node.id(k1, registry)}\n"
         for k2, vv2 in self.bindings_down.items():
-            str_ += (f"down: {Node.id(k2)} -> [{', '.join(str(Node.id(v)) for v in vv2)}]\n")
+            str_ += (f"down: {Node.id(k2, registry)} -> [{', '.join(str(Node.id(v, registry)) for v in vv2)}]\n")
         return str_
 
     def check_above(self, output_id: int):
@@ -109,7 +418,7 @@ class Bindings:
         if not self.layer_above:
             raise TypeError("layer_above is not set")
         
-        if not Node.id(output_id) in self.layer_above.nodes:
+        if not self.layer_above.contains_id(output_id):
             raise TypeError(f"Node #{output_id} does not exist in Layer #{self.layer_above.id}")
         
     def check_below(self, output_id: int):
@@ -122,7 +431,7 @@ class Bindings:
         if not self.layer_below:
             raise TypeError("layer_below is not set")
         
-        if not Node.id(output_id) in self.layer_below.nodes:
+        if not self.layer_below.contains_id(output_id):
             raise TypeError(f"Node #{output_id} does not exist in Layer #{self.layer_below.id}")
         
     def check_input(self, input_id: int):
@@ -132,48 +441,56 @@ class Bindings:
         Args:
             input_id: The ID of the input node.
         '''
-        if not Node.id(input_id) in self.anchor.nodes:
+        if not self.anchor.contains_id(input_id):
             raise TypeError(f"Node #{input_id} does not exist in Layer #{self.anchor.id}")
 
-    def bind_up(self, input_id: int, output_id: int):
+    def bind_up(self, input_id: int, output_id: int, validate: bool = True):
         '''
         Binds an input node in the anchor layer to an output node in the parent layer.
         
         Args:
             input_id: The ID of the input node (the node binding itself to the output).
             output_id: The ID of the output node (the node that is being bound).
+            validate: Whether to check that both nodes are in their layers. Only skip this for trusted bulk loads.
         '''
 
-        bindings_logger.debug(f"binding up: {input_id} -> {output_id}")
+        if bindings_logger.isEnabledFor(logging.DEBUG):
+            bindings_logger.debug("binding up: %d -> %d", input_id, output_id)
 
-        self.check_above(output_id)
-        self.check_input(input_id)
+        if validate:
+            self.check_above(output_id)
+            self.check_input(input_id)
         
         if input_id not in self.bindings_up:
             self.bindings_up[input_id] = []
         
         if output_id not in self.bindings_up[input_id]:
             self.bindings_up[input_id].append(output_id)
+            self.version = next(_binding_versions)
 
-    def bind_down(self, input_id: int, output_id: int):
+    def bind_down(self, input_id: int, output_id: int, validate: bool = True):
         '''
         Binds an input node in the anchor layer to an output node in the child layer.
         
         Args:
             input_id: The ID of the input node (the node binding itself to the output).
             output_id: The ID of the output node (the node that is being bound).
+            validate: Whether to check that both nodes are in their layers. Only skip this for trusted bulk loads.
         '''
 
-        bindings_logger.debug(f"binding down: {input_id} -> {output_id}")
+        if bindings_logger.isEnabledFor(logging.DEBUG):
+            bindings_logger.debug("binding down: %d -> %d", input_id, output_id)
 
-        self.check_below(output_id)
-        self.check_input(input_id)
+        if validate:
+            self.check_below(output_id)
+            self.check_input(input_id)
         
         if input_id not in self.bindings_down:
             self.bindings_down[input_id] = []
         
         if output_id not in self.bindings_down[input_id]:
             self.bindings_down[input_id].append(output_id)
+            self.version = next(_binding_versions)
 
     # -------------------------- Grouping and ungrouping ------------------------- #
 
@@ -181,68 +498,61 @@ class Bindings:
     # three nodes B, C, or D, there is an option to automatically include Node E
     # with Node A in a group of input nodes that go to all three nodes
     @staticmethod
-    def group(bindings, by_common_singular_inputs=False):
+    def group(bindings: 'Bindings.Dictionary', by_common_singular_inputs=False) -> Mapping[Tuple[int, ...], List[int]]:
         '''
-        Groups a dictionary of bindings into a list of (input_id, output_id) tuples.
+        Groups a dictionary of bindings by their outputs.
+
+        Groups are in the order their first input appears in the bindings, and so are
+        the inputs within each group. Inputs without any outputs are grouped together.
 
         Args:
             bindings: The dictionary of bindings.
-            by_common_singular_inputs: If True, all inputs that share any single output will be grouped together.
-        '''
-
-        result = {}
-
-        outputs = []
-        for output in bindings.values():
-            if output not in outputs:
-                outputs.append(output)
-
-        # groups the outputs by an input.
-        # implemented RECURSIVELY - to prevent errors when changing
-        def group_outputs(i) -> None:
-            # here's our base case:
-            if i == len(outputs):
-                return  # stop when reaching the end.
-
-            output = outputs[i]
-
-            def list_contains_number_in_output(lst: Sequence[int]) -> bool:
-                return any(
-                    num in output
-                    for num in lst
-                )
-
-            bindings_with_output: dict[int, list[int]] = {
-                i: o \
-                for i, o in bindings.items()
-                if (
-                    list_contains_number_in_output(o) # condition
-                    if by_common_singular_inputs
-                    else (o == output)
-                )
-            } # inputs that share this output. there has to be at least one.
-            print(f'{bindings_with_output=}')
-
-            if by_common_singular_inputs:
-                # get ALL the outputs
-                output = reduce(
-                    lambda a, b: list({ *a, *b }),
-                    bindings_with_output.values()
-                )
-
-            inputs_sharing_output = []
-            # build a tuple with all these input(s)
-            for input_ in bindings_with_output:
-                inputs_sharing_output.append(input_)
-            result[tuple(inputs_sharing_output)] = output
-            # convert inputs_sharing-output to a tuple
-            # using it as a key
-
-            group_outputs(i + 1)  # keep going
-
-        group_outputs(0)
+            by_common_singular_inputs: If True, inputs that share any single output, directly
+                or through other inputs, are grouped together with all of their outputs.
+                Otherwise, only inputs with exactly the same outputs are.
 
-        return result
+        Returns:
+            A dictionary of (input IDs) -> output IDs.
+        '''
+        if by_common_singular_inputs:
+            # union-find over the outputs; the outputs of each input are joined into one set
+            parent: dict[int, int] = {}
+
+            def find(output: int) -> int:
+                root = output
+                while parent[root] != root:
+                    root = parent[root]
+
+                while parent[output] != root:
+                    parent[output], output = root, parent[output]
+
+                return root
+
+            for outputs in bindings.values():
+                for output in outputs:
+                    parent.setdefault(output, output)
+
+                for output in outputs[1:]:
+                    a, b = find(outputs[0]), find(output)
+                    if a != b:
+                        parent[b] = a
+
+            def key(outputs):
+                return find(outputs[0]) if outputs else None
+        else:
+            def key(outputs):
+                return tuple(outputs)
+
+        # group key -> (inputs, outputs in the order they're first seen)
+        groups: dict = {}
+
+        for input_, outputs in bindings.items():
+            inputs, group_outputs = groups.setdefault(key(outputs), ([], {}))
+
+            inputs.append(input_)
+            group_outputs.update(dict.fromkeys(outputs))
+
+        return { tuple(inputs): list(outputs) for inputs, outputs in groups.values() }
 
     @staticmethod
     def ungroup_bindings(bindings: 'Bindings.Dictionary', is_sorted=True) -> List[Tuple[int, int]]:
@@ -261,8 +571,8 @@ class Bindings:
         sorted_bindings = {}
         if is_sorted:
             for input_id, output_ids in sorted(bindings.items(), key=lambda x: x[0]):
-                output_ids.sort()
-                sorted_bindings[input_id] = output_ids
+                # sorted copies, since the lists may be the ones the bindings are stored in
+                sorted_bindings[input_id] = sorted(output_ids)
             bindings = sorted_bindings
 
         for input_id, output_ids in bindings.items():
@@ -273,20 +583,23 @@ class Bindings:
     # ---------------------------------- Padding --------------------------------- #
 
     def all_node_bindings(self, direction: str) -> 'Bindings.Dictionary':
+        '''
+        Returns the bindings in one direction, with every unbound node in the anchor layer bound to nothing.
+
+        The result is a read-only view of the bindings, not a copy.
+        '''
         if direction not in ['up', 'down']:
             raise ValueError(f"direction must be 'up' or 'down', not '{direction}'")
         
-        bindings = None
-
-        bindings = deepcopy(self.bindings_up if direction == 'up' else self.bindings_down)
+        return PaddedBindings(self.bindings_up if direction == 'up' else self.bindings_down, self.anchor)
 
-        all_node_ids = [node.id for node in self.anchor.nodes if node.id not in bindings.keys()]
+def _add_bindings(bindings: 'Bindings.Dictionary', input_id: int, output_ids: Sequence[int]) -> None:
+    existing = bindings.get(input_id)
 
-        bindings.update({
-            node_id: [] for node_id in all_node_ids
-        })
-
-        return bindings
+    if existing is None:
+        bindings[input_id] = list(output_ids)
+    else:
+        existing.extend(o for o in output_ids if o not in existing)
 
 # ---------------------------------------------------------------------------- #
 #                               Alignments class                               #
@@ -298,7 +611,7 @@ def node_bindings_down(layer: Layer) -> str:
     grouped_bindings = Bindings.group(layer.bindings.all_node_bindings('down'))
 
     grouped_bindings = {
-        Node.ids(k): Node.ids(v) \
+        Node.ids(k, layer.registry): Node.ids(v, layer.registry) \
             for k, v in grouped_bindings.items()
     }
     return grouped_bindings
@@ -328,12 +641,13 @@ class Alignments:
 
     It is used to store the bindings that connect nodes to and from each other in different layers.
     '''
-    def __init__(self, num_layers_or_layers_list: Union[int, List[Layer]]):
+    def __init__(self, num_layers_or_layers_list: Union[int, List[Layer]], csr: bool = False):
         '''
         Instantiates an Alignments object.
 
         Args:
             num_layers_or_layers_list: The number of blank layers to create, or a list of layers that will be set.
+            csr: If True, translations follow CSR matrices of the bindings (see compile()) instead of the binding dictionaries.
         '''
         match type(num_layers_or_layers_list).__name__:
             case 'list':
@@ -342,20 +656,41 @@ class Alignments:
                 self.layers = [Layer([]) for _ in range(num_layers_or_layers_list)]
             case _:
                 raise TypeError(f"num_layers_or_layers_list must be int or list, not {type(num_layers_or_layers_list)}")
+
+        # node IDs are looked up in the registry that the layers were made in
+        self.registry: Registry = self.layers[0].registry if self.layers else current_registry()
         
         for i, l in enumerate(self.layers):
             l.set_this_layer_for_all_nodes()
+            l.ordinal = i
 
-            idx = self.layers.index(l)
             bindings = Bindings(
                 anchor=l,
-                layer_above=self.layers[idx - 1] if i > 0 else None,
-                layer_below=self.layers[idx + 1] if i < len(self.layers) - 1 else None)
+                layer_above=self.layers[i - 1] if i > 0 else None,
+                layer_below=self.layers[i + 1] if i < len(self.layers) - 1 else None)
 
             l.bindings = bindings
 
+        self.csr = csr
+        self._matrices: Optional[List[Tuple[CSRMatrix, CSRMatrix]]] = None
+
+        # (node ID, direction, amount) -> { node ID reached: number of paths to it }
+        self._translations: dict[Tuple[int, int, int], dict[int, int]] = {}
+        # the version of each layer's bindings when the caches above were started
+        self._versions: Tuple[int, ...] = self._binding_versions()
+
     def __repr__(self):
         return 'Alignments( ' + compact_alignments_str(self) + ' )'
+
+    def layer_number(self, layer: Layer) -> int:
+        '''
+        Returns the number of a layer within the alignments.
+        '''
+        # the ordinal is only trusted if the layer hasn't been added to other alignments since
+        if layer.ordinal is not None and layer.ordinal < len(self.layers) and self.layers[layer.ordinal] is layer:
+            return layer.ordinal
+
+        return self.layers.index(layer)
     
     # -------------------------------- Add a layer ------------------------------- #
 
@@ -363,7 +698,11 @@ class Alignments:
         '''
         Adds a new blank layer to the end of the list of layers.
         '''
-        self.layers.append(Layer([]))
+        with registry_scope(self.registry, release=False):
+            self.layers.append(Layer([]))
+
+        self.layers[-1].ordinal = len(self.layers) - 1
+
         self.layers[-2].bindings.layer_below = self.layers[-1]
 
         self.layers[-1].bindings = Bindings(
@@ -371,26 +710,89 @@ class Alignments:
             layer_above=self.layers[-2]
         )
 
+        self.invalidate()
+
+    # ----------------------------- Compiled bindings ---------------------------- #
+
+    def compile(self) -> List[Tuple[CSRMatrix, CSRMatrix]]:
+        '''
+        Builds CSR matrices of the bindings between each pair of adjacent layers.
+
+        The matrices are rebuilt once a layer's bindings change, or a layer is added.
+        Call invalidate() after changing the nodes of a layer directly.
+
+        Returns:
+            List[Tuple[CSRMatrix, CSRMatrix]]: A (down, up) pair for each pair of layers; down goes
+                from layer k to layer k + 1, and up from layer k + 1 back to layer k.
+        '''
+        self._check_versions()
+
+        matrices = []
+
+        for upper, lower in zip(self.layers, self.layers[1:]):
+            down = CSRMatrix.from_rows(
+                ([lower.position(o) for o in upper.bindings.bindings_down.get(i, ())] for i in upper.ids),
+                len(lower.ids))
+            up = CSRMatrix.from_rows(
+                ([upper.position(o) for o in lower.bindings.bindings_up.get(i, ())] for i in lower.ids),
+                len(upper.ids))
+
+            matrices.append((down, up))
+
+        self._matrices = matrices
+
+        return matrices
+
+    def invalidate(self) -> None:
+        '''
+        Drops the compiled bindings and cached translations, so that they are rebuilt when they are next needed.
+        '''
+        self._matrices = None
+        self._translations = {}
+        self._versions = self._binding_versions()
+
+    def _binding_versions(self) -> Tuple[int, ...]:
+        return tuple(layer.bindings.version if layer.bindings else 0 for layer in self.layers)
+
+    def _check_versions(self) -> None:
+        # bindings can be added through the layers' Bindings objects, which don't know about the caches
+        if self._versions != self._binding_versions():
+            self.invalidate()
+
     # ---------------- Instantiate alignments from aligner output ---------------- #
 
     @staticmethod
-    def alignments_from_word(word: Word) -> 'Alignments':
+    def alignments_from_word(word: 'Word', csr: bool = False) -> 'Alignments':
         if word.alignments:
-            alignments = Alignments(2)
+            chunks = list(zip(*word.alignments))
+
+            grapheme_layer = Layer.from_data([grapheme for grapheme_collection, _ in chunks for grapheme in grapheme_collection])
+            phoneme_layer = Layer.from_data([phoneme for _, phoneme_collection in chunks for phoneme in phoneme_collection])
 
-            graphemes, phonemes = word.alignments
+            alignments = Alignments([grapheme_layer, phoneme_layer], csr=csr)
 
-            for grapheme_collection, phoneme_collection in zip(graphemes, phonemes):
-                g_nodes = [Node(grapheme) for grapheme in grapheme_collection]
-                p_nodes = [Node(phoneme) for phoneme in phoneme_collection]
+            # the positions of each chunk's graphemes and phonemes within their layers
+            groups = []
+            g_start = p_start = 0
 
-                alignments.layers[0].extend(g_nodes)
-                alignments.layers[1].extend(p_nodes)
+            for grapheme_collection, phoneme_collection in chunks:
+                g_stop = g_start + len(grapheme_collection)
+                p_stop = p_start + len(phoneme_collection)
 
-                # Bind the nodes to each other
-                for g in g_nodes:
-                    for p in p_nodes:
-                        alignments.bind(g, p)
+                groups.append((range(g_start, g_stop), range(p_start, p_stop)))
+                g_start, p_start = g_stop, p_stop
+
+            # Bind the nodes in each chunk to each other
+            alignments.bind_groups(
+                (grapheme_layer.ids[g.start:g.stop], phoneme_layer.ids[p.start:p.stop]) for g, p in groups
+            )
+
+            if csr:
+                # the groups are the matrix already, so it doesn't have to be compiled from the bindings
+                alignments._check_versions()
+                down = CSRMatrix.from_groups(groups, len(grapheme_layer.ids), len(phoneme_layer.ids))
+
+                alignments._matrices = [(down, down.transpose())]
         
             return alignments
         
@@ -398,16 +800,22 @@ class Alignments:
             raise ValueError("Word does not have alignments.")
 
     @staticmethod
-    def alignments_from_words(words: list[Word]) -> 'Alignments':
-        return [Alignments.alignments_from_word(word) for word in words]
+    def alignments_from_words(words: list['Word'], csr: bool = False) -> 'Alignments':
+        return [Alignments.alignments_from_word(word, csr=csr) for word in words]
     
     @staticmethod
-    async def alignments_from_text(text: str) -> 'Alignments':
-        return Alignments.alignments_from_words(await align_text(text))
+    async def alignments_from_text(text: str, pool: Optional['M2MAlignerPool'] = None, csr: bool = False) -> 'Alignments':
+        from src.aligner.aligner import align_text
+
+        words = await align_text(text, pool=pool)
+
+        # each text gets a registry of its own, which is freed along with its alignments
+        with registry_scope(release=False):
+            return Alignments.alignments_from_words(words, csr=csr)
 
     # ---------------------------------------------------------------------------- #
 
-    def bind_id(self, input_id: int, output_id: int):
+    def bind_id(self, input_id: int, output_id: int, validate: bool = True):
         '''
         Binds an input node in its to an output node in another layer.
         
@@ -416,34 +824,87 @@ class Alignments:
         Args:
             input_id: The ID of the input node (the node binding itself to the output).
             output_id: The ID of the output node (the node that is being bound).
+            validate: Whether to check that both nodes are in their layers. Only skip this for trusted bulk loads.
         '''
-        input_layer = Node.id(input_id).layer
-        output_layer = Node.id(output_id).layer
+        input_layer = Node.id(input_id, self.registry).layer
+        output_layer = Node.id(output_id, self.registry).layer
 
         # Check that the layers are adjacent.
         # -1 = above, 1 = below
-        above_or_below = self.layers.index(output_layer) - self.layers.index(input_layer)
+        above_or_below = self.layer_number(output_layer) - self.layer_number(input_layer)
 
-        bindings_logger.debug(f"LAYERS.BIND CALL: {input_id} -> {output_id} ({above_or_below})")
+        if bindings_logger.isEnabledFor(logging.DEBUG):
+            bindings_logger.debug("LAYERS.BIND CALL: %d -> %d (%d)", input_id, output_id, above_or_below)
 
         if above_or_below == -1:
-            input_layer.bindings.bind_up(input_id, output_id)
-            output_layer.bindings.bind_down(output_id, input_id)
+            input_layer.bindings.bind_up(input_id, output_id, validate)
+            output_layer.bindings.bind_down(output_id, input_id, validate)
         elif above_or_below == 1:
-            input_layer.bindings.bind_down(input_id, output_id)
-            output_layer.bindings.bind_up(output_id, input_id)
+            input_layer.bindings.bind_down(input_id, output_id, validate)
+            output_layer.bindings.bind_up(output_id, input_id, validate)
         else:
             raise TypeError(f"Layers #{input_layer.id}, containing Node #{input_id}, and #{output_layer.id}, containing Node #{output_id}, are not adjacent")
 
-    def bind(self, input_node: Node, output_node: Node):
+    def bind(self, input_node: Node, output_node: Node, validate: bool = True):
         '''
         A shortcut for binding an input node in its to an output node in another layer.
 
         Args:
             input_node: The input node (the node binding itself to the output).
             output_node: The output node (the node that is being bound).
+            validate: Whether to check that both nodes are in their layers. Only skip this for trusted bulk loads.
+        '''
+        self.bind_id(input_node.id, output_node.id, validate)
+
+    def bind_groups(self, groups: Iterable[Tuple[Sequence[int], Sequence[int]]], layer_number: int = 0, validate: bool = False):
+        '''
+        Binds every input node in each group to every output node in the same group, in one pass.
+
+        The input nodes are in one layer and the output nodes are in the layer below it.
+        Bindings aren't logged one by one.
+
+        Args:
+            groups: Pairs of (input node IDs, output node IDs), such as the grapheme and phoneme chunks of an aligned word.
+            layer_number: The number of the layer that the input nodes are in.
+            validate: Whether to check that each node is in its layer.
+        '''
+        upper = self.layers[layer_number]
+        lower = self.layers[layer_number + 1]
+
+        # a node that's listed twice in a group is only bound once
+        groups = [(tuple(dict.fromkeys(inputs)), tuple(dict.fromkeys(outputs))) for inputs, outputs in groups]
+
+        if validate:
+            for inputs, outputs in groups:
+                for input_id in inputs:
+                    upper.bindings.check_input(input_id)
+                for output_id in outputs:
+                    upper.bindings.check_below(output_id)
+
+        bindings_logger.debug("binding %d groups: layer #%d -> layer #%d", len(groups), upper.id, lower.id)
+
+        down = upper.bindings.bindings_down
+        up = lower.bindings.bindings_up
+
+        for inputs, outputs in groups:
+            for input_id in inputs:
+                _add_bindings(down, input_id, outputs)
+            for output_id in outputs:
+                _add_bindings(up, output_id, inputs)
+
+        upper.bindings.version = next(_binding_versions)
+        lower.bindings.version = next(_binding_versions)
+
+    def bind_many(self, pairs: Iterable[Tuple[int, int]], layer_number: int = 0, validate: bool = False):
+        '''
+        Binds many pairs of nodes at once. See bind_groups().
+
+        Args:
+            pairs: Pairs of (input node ID, output node ID).
+            layer_number: The number of the layer that the input nodes are in.
+            validate: Whether to check that each node is in its layer.
         '''
-        self.bind_id(input_node.id, output_node.id)
+        self.bind_groups((((i,), (o,)) for i, o in pairs), layer_number, validate)
 
 
     # ------------------------- Traversing the alignments ------------------------ #
@@ -554,7 +1015,7 @@ class Alignments:
             TypeError: If an output node is not within a Layer.
             Exception: If an input node is at the last layer and cannot traverse any further.
         """
-        return [Node.id(i) for i in self.output_ids_for_input(node)]
+        return [Node.id(i, node.registry) for i in self.output_ids_for_input(node)]
     
     def get_input_nodes_for_output(self, node: Node) -> List[Node]:
         """
@@ -570,7 +1031,7 @@ class Alignments:
             TypeError: If an output node is not within a Layer.
             Exception: If an input node is at the last layer and cannot traverse any further.
         """
-        return [Node.id(i) for i in self.input_ids_for_output(node)]
+        return [Node.id(i, node.registry) for i in self.input_ids_for_output(node)]
     
     def get_output_nodes_for_inputs(self, nodes: Sequence[Node], return_respective_lists=False) -> Union[List[Node], List[List[Node]]]:
         """
@@ -639,11 +1100,9 @@ class Alignments:
         """
         if amount == 0:
             return nodes
-        output_nodes = self.get_output_nodes_for_inputs(nodes, return_respective_lists=return_respective_lists)
-        if return_respective_lists:
-            return [self.translate_down(o, amount - 1) for o in output_nodes]
-        else:
-            return self.translate_down(output_nodes, amount - 1)
+        if self.csr:
+            return self._translate_csr(nodes, amount, 1, return_respective_lists)
+        return self._translate_cached(nodes, amount, 1, return_respective_lists)
     
     def translate_up(self, nodes: Sequence[Node], amount: int, return_respective_lists=False) -> Union[List[Node], List[List[Node]]]:
         """
@@ -664,18 +1123,138 @@ class Alignments:
         """
         if amount == 0:
             return nodes
-        input_nodes = self.get_input_nodes_for_outputs(nodes, return_respective_lists=return_respective_lists)
+        if self.csr:
+            return self._translate_csr(nodes, amount, -1, return_respective_lists)
+        return self._translate_cached(nodes, amount, -1, return_respective_lists)
+    
+    def _translate_cached(self, nodes: Sequence[Node], amount: int, step: int, return_respective_lists=False) -> Union[List[Node], List[List[Node]]]:
+        # Looks up where each node ends up in the translation cache. The results are the
+        # same as translating one layer at a time, including nodes reached more than once.
+        self._check_versions()
+
+        respective_paths = []
+
+        for node in nodes:
+            if not node.layer:
+                raise TypeError('Node is not within a Layer')
+
+            respective_paths.append(self._paths(node.id, self.layer_number(node.layer), step, amount))
+
         if return_respective_lists:
-            return [self.translate_up(i, amount - 1) for i in input_nodes]
+            # after a single hop, each list stays in the order its nodes were bound
+            return [self._nodes_for_paths(list(paths.items()), sort=amount > 1) for paths in respective_paths]
+
+        merged: dict[int, int] = {}
+        for paths in respective_paths:
+            for node_id, count in paths.items():
+                merged[node_id] = merged.get(node_id, 0) + count
+
+        return self._nodes_for_paths(list(merged.items()), sort=True)
+
+    def _paths(self, node_id: int, layer_number: int, step: int, amount: int) -> dict[int, int]:
+        # The nodes that are {amount} layers away from a node, and the number of paths to each.
+        # Each node's paths are built from those of the nodes it's bound to, and cached.
+        key = (node_id, step, amount)
+        paths = self._translations.get(key)
+
+        if paths is not None:
+            return paths
+
+        bindings = self.layers[layer_number].bindings
+
+        if step == 1:
+            if not bindings.layer_below:
+                raise Exception('Input node is at the last layer. Cannot traverse any further.')
+            bound_ids = bindings.bindings_down[node_id]
         else:
-            return self.translate_up(input_nodes, amount - 1)
-    
+            if not bindings.layer_above:
+                raise Exception('Output node is at the first layer. Cannot traverse any further.')
+            bound_ids = bindings.bindings_up[node_id]
+
+        if amount == 1:
+            paths = dict.fromkeys(bound_ids, 1)
+        else:
+            paths = {}
+            for bound_id in bound_ids:
+                for reached_id, count in self._paths(bound_id, layer_number + step, step, amount - 1).items():
+                    paths[reached_id] = paths.get(reached_id, 0) + count
+
+        self._translations[key] = paths
+
+        return paths
+
+    def _translate_csr(self, nodes: Sequence[Node], amount: int, step: int, return_respective_lists=False) -> Union[List[Node], List[List[Node]]]:
+        # Follows the compiled bindings, with the same results as the cached translation,
+        # including the KeyError for a node that isn't bound in the direction of travel
+        if return_respective_lists:
+            # after a single hop, each list stays in the order its nodes were bound
+            return [self._nodes_for_paths(self._propagate([node], amount, step), sort=amount > 1) for node in nodes]
+
+        return self._nodes_for_paths(self._propagate(nodes, amount, step), sort=True)
+
+    def _propagate(self, nodes: Sequence[Node], amount: int, step: int) -> List[Tuple[int, int]]:
+        # Each hop is a sparse matrix-vector product over the number of paths to each node,
+        # so that nodes reached more than once are repeated, as they are in the recursive translation.
+        self._check_versions()
+
+        matrices = self._matrices if self._matrices is not None else self.compile()
+
+        # layer number -> { position in the layer: number of paths }
+        frontier: dict[int, dict[int, int]] = {}
+
+        for node in nodes:
+            if not node.layer:
+                raise TypeError('Node is not within a Layer')
+
+            k = self.layer_number(node.layer)
+            position = node.layer.position(node.id)
+
+            vector = frontier.setdefault(k, {})
+            vector[position] = vector.get(position, 0) + 1
+
+        for _ in range(amount):
+            reached: dict[int, dict[int, int]] = {}
+
+            for k, vector in frontier.items():
+                if step == 1 and k == len(self.layers) - 1:
+                    raise Exception('Input node is at the last layer. Cannot traverse any further.')
+                if step == -1 and k == 0:
+                    raise Exception('Output node is at the first layer. Cannot traverse any further.')
+
+                matrix = matrices[k][0] if step == 1 else matrices[k - 1][1]
+                target = reached.setdefault(k + step, {})
+
+                # the matrices can't tell an unbound node from one bound to nothing, but the bindings can
+                bindings = self.layers[k].bindings
+                bound = bindings.bindings_down if step == 1 else bindings.bindings_up
+                ids = self.layers[k].ids
+
+                for position in vector:
+                    if ids[position] not in bound:
+                        raise KeyError(ids[position])
+
+                for position, count in matrix.multiply(vector).items():
+                    target[position] = target.get(position, 0) + count
+
+            frontier = reached
+
+        return [
+            (self.layers[k].ids[position], count)
+            for k, vector in frontier.items()
+            for position, count in vector.items()
+        ]
+
+    def _nodes_for_paths(self, paths: List[Tuple[int, int]], sort: bool) -> List[Node]:
+        if sort:
+            paths.sort()
+
+        return list(Node.ids([node_id for node_id, count in paths for _ in range(count)], self.registry))
+
     def translate_to_layer(self, nodes: Sequence[Node], layer_number: int, return_respective_lists=False) -> Union[List[Node], List[List[Node]]]:
-        all_layer_ids = [layer.id for layer in self.layers]
         respective_lists = []
 
         for node in nodes:
-            idx = all_layer_ids.index(node.layer.id)
+            idx = self.layer_number(node.layer)
 
             translate = (self.translate_down if idx < layer_number else self.translate_up)
             amount = abs(idx - layer_number)
@@ -688,6 +1267,3 @@ class Alignments:
             return list(itertools.chain(*respective_lists))
 
 # TODO 07/06/2024: finish this
-# ---------------------------------------------------------------------------- #
-
-print(asyncio.run(Alignments.alignments_from_text("maneuver")))
\ No newline at end of file
@@ -0,0 +1,110 @@
+from array import array
+from typing import Iterable, Mapping, Sequence, Tuple
+
+# ---------------------------------------------------------------------------- #
+#                        Compressed sparse row bindings                        #
+# ---------------------------------------------------------------------------- #
+
+class CSRMatrix:
+    '''
+    The bindings from one layer to an adjacent layer, in compressed sparse row form.
+
+    Rows and columns are positions of nodes within their layers. The columns that
+    row i is bound to are indices[indptr[i]:indptr[i + 1]], in the order they were bound.
+    '''
+    __slots__ = ('indptr', 'indices', 'n_cols')
+
+    def __init__(self, indptr: array, indices: array, n_cols: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.n_cols = n_cols
+
+    def __repr__(self):
+        return f'CSRMatrix({self.n_rows}x{self.n_cols}, {len(self.indices)} bindings)'
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.indptr) - 1
+
+    def row(self, i: int) -> array:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    # ------------------------------- Construction ------------------------------- #
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Iterable[int]], n_cols: int) -> 'CSRMatrix':
+        '''
+        Builds a matrix from the columns that each row is bound to.
+        '''
+        indptr = array('i', [0])
+        indices = array('i')
+
+        for row in rows:
+            indices.extend(row)
+            indptr.append(len(indices))
+
+        return cls(indptr, indices, n_cols)
+
+    @classmethod
+    def from_groups(cls, groups: Iterable[Tuple[Sequence[int], Sequence[int]]], n_rows: int, n_cols: int) -> 'CSRMatrix':
+        '''
+        Builds a matrix in which every row in a group is bound to every column in the same group.
+
+        Args:
+            groups: Pairs of (row positions, column positions), such as the grapheme and
+                phoneme collections of an aligned word.
+            n_rows: The number of nodes in the layer the rows are in.
+            n_cols: The number of nodes in the layer the columns are in.
+        '''
+        rows = [[] for _ in range(n_rows)]
+
+        for row_group, col_group in groups:
+            for i in row_group:
+                rows[i].extend(j for j in col_group if j not in rows[i])
+
+        return cls.from_rows(rows, n_cols)
+
+    def transpose(self) -> 'CSRMatrix':
+        '''
+        Returns the bindings in the opposite direction. Each row of the result is in increasing order.
+        '''
+        # counting sort of the bindings by column
+        counts = array('i', bytes(4 * (self.n_cols + 1)))
+        for j in self.indices:
+            counts[j + 1] += 1
+
+        for j in range(self.n_cols):
+            counts[j + 1] += counts[j]
+
+        indptr = array('i', counts)
+        indices = array('i', bytes(4 * len(self.indices)))
+
+        for i in range(self.n_rows):
+            for j in self.row(i):
+                indices[counts[j]] = i
+                counts[j] += 1
+
+        return CSRMatrix(indptr, indices, self.n_rows)
+
+    # --------------------------------- Traversal -------------------------------- #
+
+    def multiply(self, vector: Mapping[int, int]) -> dict[int, int]:
+        '''
+        Follows the bindings of a sparse vector of rows.
+
+        Args:
+            vector: The number of times each row was reached.
+
+        Returns:
+            dict[int, int]: The number of times each column is reached from the rows, in
+                the order the columns are first reached.
+        '''
+        indptr = self.indptr
+        indices = self.indices
+        result: dict[int, int] = {}
+
+        for i, count in vector.items():
+            for j in indices[indptr[i]:indptr[i + 1]]:
+                result[j] = result.get(j, 0) + count
+
+        return result
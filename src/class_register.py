@@ -1,27 +1,253 @@
-from typing import Generic, List, Mapping, Sequence, Type, TypeVar
+from bisect import bisect_right
+from contextlib import contextmanager
+from contextvars import ContextVar
+import itertools
+from threading import Lock
+from typing import Any, Callable, Generic, Hashable, Iterator, List, Mapping, Optional, Sequence, Type, TypeVar
+import weakref
 
-_registry: Mapping[str, list] = {}
+# ---------------------------------------------------------------------------- #
+#                                 Symbol tables                                #
+# ---------------------------------------------------------------------------- #
 
-def _register_inst(instance) -> None:
-    class_name = instance.__class__.__name__
+class SymbolTable:
+    '''
+    Interns values, so that equal values are stored once and referred to by number.
+    '''
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.codes: Mapping[Hashable, int] = {}
+        # the codes of the values that are equal to each value, such as 1, 1.0 and True
+        self.equal: Mapping[Hashable, List[int]] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, code: int) -> Any:
+        return self.values[code]
+
+    @staticmethod
+    def _key(value) -> Hashable:
+        # 1, 1.0 and True are equal, but they aren't the same symbol
+        return (type(value), value)
+
+    def intern(self, value) -> int:
+        try:
+            key = self._key(value)
+            code = self.codes.get(key)
+        except TypeError:
+            # unhashable values can't be shared, so each one gets its own code
+            key = code = None
+
+        if code is not None:
+            return code
+
+        with self._lock:
+            if key is not None and key in self.codes:
+                return self.codes[key]
+
+            self.values.append(value)
+            code = len(self.values) - 1
+
+            if key is not None:
+                self.codes[key] = code
+                self.equal.setdefault(value, []).append(code)
+
+        return code
+
+    def code(self, value) -> Optional[int]:
+        '''
+        Returns the code for a value without interning it, or None if it hasn't been interned.
+        '''
+        try:
+            return self.codes.get(self._key(value))
+        except TypeError:
+            return None
+
+    def codes_equal_to(self, value) -> List[int]:
+        '''
+        Returns the codes of every interned value that is equal to the value.
+        '''
+        try:
+            return self.equal.get(value, [])
+        except TypeError:
+            return []
+
+    def clear(self) -> None:
+        with self._lock:
+            self.values.clear()
+            self.codes.clear()
+            self.equal.clear()
+
+# ---------------------------------------------------------------------------- #
+#                                   Registries                                 #
+# ---------------------------------------------------------------------------- #
+
+class Registry:
+    '''
+    An arena of indexed instances, grouped by class name.
+
+    Instances are numbered from 0 within each registry, and clearing or dropping
+    a registry releases everything that was registered in it at once. IDs are
+    allocated under a lock, so instances can be created from several threads.
+
+    A range of IDs can be reserved with a factory, so that the instances for
+    them are only created when they are first looked up.
+    '''
+
+    def __init__(self, weak: bool = False):
+        '''
+        Instantiates a Registry object.
+
+        Args:
+            weak: If True, only weak references are kept, so that instances are
+                released as soon as nothing else refers to them.
+        '''
+        self.weak = weak
+        self.classes: Mapping[str, list] = {}
+        self.symbols = SymbolTable()
+        self._lock = Lock()
+
+        # bumped whenever the data of an instance is reassigned, so that anything
+        # that caches the data can tell when it may be out of date
+        self.data_version = 0
+
+        # class name -> (starts of reserved ranges, (stop, factory) for each range)
+        self._reserved: Mapping[str, tuple[List[int], List[tuple[int, Callable[[int], Any]]]]] = {}
+
+    def __repr__(self):
+        counts = ', '.join(f'{k}: {len(v)}' for k, v in self.classes.items())
+        return f'Registry({"weak, " if self.weak else ""}{{{counts}}})'
+
+    def instances(self, class_name: str) -> List:
+        instances = self.classes.get(class_name)
+
+        if instances is None:
+            # setdefault, so that two threads can't each create a list
+            instances = self.classes.setdefault(class_name, [])
+
+        return instances
+
+    def register(self, instance) -> int:
+        instances = self.instances(instance.__class__.__name__)
+        entry = weakref.ref(instance) if self.weak else instance
+
+        # appending and reading the length back have to happen together
+        with self._lock:
+            instances.append(entry)
+            return len(instances) - 1
+
+    def reserve(self, class_name: str, count: int, factory: Callable[[int], Any]) -> range:
+        '''
+        Reserves a range of consecutive IDs, whose instances are created by the factory on first lookup.
 
-    if not _registry.get(class_name):
-        _registry[class_name] = []
-    
-    _registry[class_name].append(instance)
+        Args:
+            class_name: The class that the IDs are for.
+            count: How many IDs to reserve.
+            factory: Creates the instance for an ID in the range. It must not register the instance.
 
-    instance.id = len(_registry[class_name]) - 1
+        Returns:
+            range: The reserved IDs.
+        '''
+        instances = self.instances(class_name)
+
+        with self._lock:
+            start = len(instances)
+            instances.extend(itertools.repeat(None, count))
+
+            starts, ranges = self._reserved.setdefault(class_name, ([], []))
+            starts.append(start)
+            ranges.append((start + count, factory))
+
+        return range(start, start + count)
+
+    def get(self, class_name: str, id: int):
+        instances = self.instances(class_name)
+        instance = instances[id]
+
+        if self.weak and instance is not None:
+            instance = instance()
+
+        if instance is None:
+            instance = self._create_reserved(class_name, id)
+
+            if instance is None:
+                raise LookupError(f"{class_name} #{id} has been garbage collected")
+
+            instances[id] = weakref.ref(instance) if self.weak else instance
+
+        return instance
+
+    def _create_reserved(self, class_name: str, id: int):
+        starts, ranges = self._reserved.get(class_name, ((), ()))
+        i = bisect_right(starts, id) - 1
+
+        if i < 0 or id >= ranges[i][0]:
+            return None
+
+        return ranges[i][1](id)
+
+    def clear(self, class_name: Optional[str] = None) -> None:
+        '''
+        Releases the instances registered under a class name, or under every class name.
+
+        The symbol table is kept, since the instances that are still referenced
+        elsewhere read their data from it. It's released along with the registry.
+        '''
+        with self._lock:
+            if class_name is None:
+                self.classes.clear()
+                self._reserved.clear()
+            else:
+                self.instances(class_name).clear()
+                self._reserved.pop(class_name, None)
+
+_default_registry = Registry()
+_registry: Mapping[str, list] = _default_registry.classes
+
+_current_registry: ContextVar[Registry] = ContextVar('registry', default=_default_registry)
+
+def current_registry() -> Registry:
+    return _current_registry.get()
+
+@contextmanager
+def registry_scope(registry: Optional[Registry] = None, weak: bool = False, release: bool = True) -> Iterator[Registry]:
+    '''
+    Registers every indexed instance created inside the block in its own registry.
+
+    Args:
+        registry: The registry to use. A new one is created if not given.
+        weak: Whether a newly created registry only keeps weak references.
+        release: Whether to clear the registry when the block ends. Instances from a
+            released registry can no longer be looked up by ID, but keep their data.
+    '''
+    registry = registry if registry is not None else Registry(weak=weak)
+    token = _current_registry.set(registry)
+
+    try:
+        yield registry
+    finally:
+        _current_registry.reset(token)
+
+        if release:
+            registry.clear()
+
+# ---------------------------------------------------------------------------- #
+
+def _register_inst(instance) -> None:
+    registry = current_registry()
+
+    instance.id = registry.register(instance)
+    instance.registry = registry
 
 def _get_registry(class_name: str) -> List:
-    if not _registry.get(class_name):
-        _registry[class_name] = []
-    
-    return _registry[class_name]
+    return current_registry().instances(class_name)
 
 def indexed(func):
     def wrapper(self, *args, **kwargs):
         _register_inst(self)
-        self.__class__.registry = _registry[self.__class__.__name__]
         func(self, *args, **kwargs)
     return wrapper
 
@@ -30,32 +256,41 @@ def indexed(func):
 
 T = TypeVar('T', bound='IndexedClass')
 
-class IndexedClass(Generic[T]):
-    id: int
-    registry: List[T]
+class IndexedMeta(type):
+    '''
+    Lets Node.id(5) look a node up by ID, while node.id stays a plain slot on each instance.
+    '''
+
+    # a property on the metaclass is a data descriptor, so on the class it wins over
+    # the id slot; instances only see the slot
+    @property
+    def id(cls) -> Callable[..., T]:
+        return cls.get_id
+
+class IndexedClass(Generic[T], metaclass=IndexedMeta):
+    __slots__ = ('id', 'registry', '__weakref__')
 
-    def __init_subclass__(self):
-        self.registry = self._registry()
-        self.registry.append(self)
+    id: int
+    registry: Registry
 
     @classmethod
     def _registry(cls: Type[T]) -> List[T]:
-        # Get the registry associated with the class from the _registry dictionary.
-        # If the registry does not exist, create an empty list and add it to the dictionary.
-        # Finally, return the registry.
+        # Get the list of instances of the class in the current registry.
+        # If the list does not exist, an empty one is created.
         return _get_registry(cls.__name__)
 
     # ---------------------------------------------------------------------------- #
 
     @classmethod
-    def id(cls: Type[T], id: int) -> T:
-        return cls.registry[id]
-    
+    def get_id(cls: Type[T], id: int, registry: Optional[Registry] = None) -> T:
+        return (registry or current_registry()).get(cls.__name__, id)
+
     @classmethod
-    def ids(cls: Type[T], ids: Sequence[int]) -> List[T]:
-        return tuple(cls.registry[id] for id in ids)
-    
+    def ids(cls: Type[T], ids: Sequence[int], registry: Optional[Registry] = None) -> List[T]:
+        registry = registry or current_registry()
+        return tuple(registry.get(cls.__name__, id) for id in ids)
+
     @classmethod
     def reset_all_id(cls: Type[T]) -> None:
-        cls.registry.clear()
-
+        # only resets the current registry; other scopes keep their IDs
+        current_registry().clear(cls.__name__)
@@ -0,0 +1,51 @@
+import logging
+import random
+from typing import Optional
+
+
+class SamplingFilter(logging.Filter):
+    '''
+    Lets through a random sample of the records below a level, and every record at or above it.
+    '''
+
+    def __init__(self, rate: float, level: int = logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.level = level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.level or random.random() < self.rate
+
+
+def library_logger(name):
+    # for loggers in src: whoever runs the code decides where (and whether) the records go
+    logger = logging.getLogger(name)
+
+    if not any(isinstance(h, logging.NullHandler) for h in logger.handlers):
+        logger.addHandler(logging.NullHandler())
+
+    return logger
+
+
+def configure_logger(name, level=logging.DEBUG, sample_rate: Optional[float] = None):
+    # for applications: sends the logger's records to stderr
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+
+    # calling this again for the same logger mustn't add a second handler
+    handler = next((h for h in logger.handlers if getattr(h, 'configured', False)), None)
+
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.configured = True
+
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+
+        logger.addHandler(handler)
+
+    handler.setLevel(level)
+
+    handler.filters = [SamplingFilter(sample_rate)] if sample_rate is not None else []
+
+    return logger
@@ -1,5 +1,7 @@
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Callable, List, Union
+import itertools
+from typing import Callable, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 from src.alignments.alignments import Layer, Node
 
 # ---------------------------------------------------------------------------- #
@@ -13,17 +15,106 @@ SingleArgumentCondition = Callable[[List[Node]], bool]
 
 Condition = Union[TwoArgumentCondition, SingleArgumentCondition]
 
-@dataclass
+def bits_from_positions(positions: Iterable[int], length: int) -> int:
+    '''
+    Builds a bitmask with the given bits set, in one pass.
+    '''
+    buffer = bytearray((length + 7) // 8)
+
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+
+    return int.from_bytes(buffer, 'little')
+
+# the positions of the set bits in each byte value
+_BYTE_POSITIONS = tuple(tuple(i for i in range(8) if byte >> i & 1) for byte in range(256))
+
+def positions_from_bits(bits: int) -> Iterator[int]:
+    '''
+    Yields the positions of the set bits of a bitmask, from lowest to highest.
+
+    The bitmask is split into bytes once, so this takes linear time in its length.
+    '''
+    for offset, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = offset << 3
+            for i in _BYTE_POSITIONS[byte]:
+                yield base + i
+
 class Selection:
     '''
-    Stores a set of indices that correspond to nodes in a layer that have been selected.
+    Stores the nodes in a layer that have been selected.
+
+    The selection is a bitmask over the positions of the nodes in the layer, so it
+    describes the layer as it was when the selection was made.
     '''
-    layer: Layer
-    selection: field(default=set())
+    __slots__ = ('layer', 'bits')
+
+    def __init__(self, layer: Layer, selection: Iterable[int] = ()):
+        '''
+        Instantiates a Selection object.
+
+        Args:
+            layer: The layer that the nodes are in.
+            selection: The IDs of the selected nodes.
+        '''
+        positions = []
+
+        for node_id in selection:
+            position = layer.position(node_id)
+
+            if position is None:
+                raise ValueError(f"Node #{node_id} does not exist in Layer #{layer.id}")
+
+            positions.append(position)
+
+        self.layer = layer
+        self.bits = bits_from_positions(positions, len(layer.ids))
+
+    @classmethod
+    def from_bits(cls, layer: Layer, bits: int) -> 'Selection':
+        selection = cls.__new__(cls)
+        selection.layer = layer
+        selection.bits = bits
+
+        return selection
+
+    @property
+    def selection(self) -> Set[int]:
+        '''
+        The IDs of the selected nodes.
+        '''
+        ids = self.layer.ids
+        return { ids[position] for position in positions_from_bits(self.bits) }
 
     @property
     def all(self) -> 'Selection':
-        return Selection(self.layer, { node.id for node in self.layer.nodes })
+        return Selection.from_bits(self.layer, (1 << len(self.layer.ids)) - 1)
+
+    def positions(self) -> Iterator[int]:
+        return positions_from_bits(self.bits)
+
+    def __iter__(self) -> Iterator[int]:
+        # node IDs, in layer order
+        ids = self.layer.ids
+        return (ids[position] for position in positions_from_bits(self.bits))
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __contains__(self, node_id: int) -> bool:
+        position = self.layer.position(node_id)
+        return position is not None and bool(self.bits >> position & 1)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Selection):
+            return NotImplemented
+        return self.layer is other.layer and self.bits == other.bits
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'Selection(layer={self.layer!r}, selection={self.selection})'
 
     def __str__(self) -> str:
         return f'Selection for Layer #{self.layer.id}: {self.selection}'
@@ -31,20 +122,28 @@ class Selection:
     # -------------- Set intersection, union, difference, symmetric -------------- #
     # -------------------- difference, etc. are all available. ------------------- #
 
+    def _check_layer(self, other: 'Selection') -> None:
+        if self.layer is not other.layer:
+            raise ValueError(f"Selections for Layer #{self.layer.id} and Layer #{other.layer.id} can't be combined")
+
     def __and__(self, other: 'Selection') -> 'Selection':
-        return Selection(self.layer, self.selection & other.selection)
+        self._check_layer(other)
+        return Selection.from_bits(self.layer, self.bits & other.bits)
 
     def __or__(self, other: 'Selection') -> 'Selection':
-        return Selection(self.layer, self.selection | other.selection)
+        self._check_layer(other)
+        return Selection.from_bits(self.layer, self.bits | other.bits)
 
     def __sub__(self, other: 'Selection') -> 'Selection':
-        return Selection(self.layer, self.selection - other.selection)
+        self._check_layer(other)
+        return Selection.from_bits(self.layer, self.bits & ~other.bits)
 
     def __xor__(self, other: 'Selection') -> 'Selection':
-        return Selection(self.layer, self.selection ^ other.selection)
+        self._check_layer(other)
+        return Selection.from_bits(self.layer, self.bits ^ other.bits)
     
     def __invert__(self) -> 'Selection':
-        return self.all - self
+        return Selection.from_bits(self.layer, ~self.bits & ((1 << len(self.layer.ids)) - 1))
 
     # ---------------------------- Running a condition --------------------------- #
 
@@ -54,9 +153,11 @@ class Selection:
         nodes = layer.nodes
 
         if condition.__code__.co_argcount == 1:
-            return Selection(layer, { node.id for node in nodes if condition(node) })
+            positions = (i for i, node in enumerate(nodes) if condition(node))
         else:
-            return Selection(layer, { node.id for i, node in enumerate(nodes) if condition(i, nodes) })
+            positions = (i for i in range(len(nodes)) if condition(i, nodes))
+
+        return Selection.from_bits(layer, bits_from_positions(positions, len(nodes)))
         
 # ---------------------------------------------------------------------------- #
 #                            SelectionFactory class                            #
@@ -66,32 +167,204 @@ class Selection:
 class SelectionFactory:
     '''
     Factory class for creating Selection objects.
+
+    Factories combined with &, |, -, ^ and ~ form an expression, which is compiled
+    the first time it is called (see compile_factory()).
     '''
 
-    condition: Callable[[Layer], Selection]
+    condition: Optional[Callable[[Layer], Selection]] = None
+
+    # if the condition only looks at one node at a time, the same test on a single node
+    predicate: Optional[Callable[[Node], bool]] = None
+    # factories with the same key select the same nodes, so they're only run once per expression
+    key: Optional[Hashable] = None
+    # if the condition looks the nodes up in the layer's index, which is quicker than running
+    # the predicate on every node, so the factory isn't fused with others
+    indexed: bool = False
+    # if the condition finds a series of values, its (values, position), so that every
+    # series in an expression can be found in the same pass
+    series: Optional[Tuple[Tuple, int]] = None
+
+    op: Optional[str] = None
+    operands: Tuple['SelectionFactory', ...] = ()
+
+    _compiled: Optional[Callable[[Layer], Selection]] = field(default=None, init=False, repr=False, compare=False)
 
-    def __call__(self, *args, **kwargs) -> Selection:
-        return self.condition(*args, **kwargs)
+    def __post_init__(self):
+        if self.condition is None and self.predicate is not None:
+            predicate = self.predicate
+            self.condition = lambda layer: Selection.select(predicate, layer)
+
+    def __call__(self, layer: Layer) -> Selection:
+        if self.op is None:
+            return self.condition(layer)
+
+        if self._compiled is None:
+            self._compiled = compile_factory(self)
+
+        return self._compiled(layer)
     
     def __str__(self) -> str:
-        return f'SelectionFactory: {self.condition}'
+        if self.op is None:
+            return f'SelectionFactory: {self.condition}'
+        return f'SelectionFactory: {self.op}({", ".join(str(o) for o in self.operands)})'
     
     # ---------------------------------------------------------------------------- #
 
     def __and__(self, other: 'SelectionFactory') -> 'SelectionFactory':
-        return SelectionFactory(lambda *args, **kwargs: self(*args, **kwargs) & other(*args, **kwargs))
+        return SelectionFactory(op='and', operands=(self, other))
     
     def __or__(self, other: 'SelectionFactory') -> 'SelectionFactory':
-        return SelectionFactory(lambda *args, **kwargs: self(*args, **kwargs) | other(*args, **kwargs))
+        return SelectionFactory(op='or', operands=(self, other))
     
     def __sub__(self, other: 'SelectionFactory') -> 'SelectionFactory':
-        return SelectionFactory(lambda *args, **kwargs: self(*args, **kwargs) - other(*args, **kwargs))
+        return SelectionFactory(op='sub', operands=(self, other))
     
     def __xor__(self, other: 'SelectionFactory') -> 'SelectionFactory':
-        return SelectionFactory(lambda *args, **kwargs: self(*args, **kwargs) ^ other(*args, **kwargs))
+        return SelectionFactory(op='xor', operands=(self, other))
     
     def __invert__(self) -> 'SelectionFactory':
-        return SelectionFactory(lambda *args, **kwargs: ~(self(*args, **kwargs)))
+        return SelectionFactory(op='not', operands=(self,))
+
+# ---------------------------- Compiling factories --------------------------- #
+
+# evaluates part of an expression to a bitmask, given the layer and the results so far
+Plan = Callable[[Layer, dict], int]
+
+COMMUTATIVE = {'and', 'or', 'xor'}
+
+def factory_key(factory: SelectionFactory) -> Hashable:
+    '''
+    A key that is the same for factories that always select the same nodes.
+    '''
+    if factory.op is None:
+        return ('leaf', factory.key if factory.key is not None else id(factory))
+
+    keys = [factory_key(operand) for operand in factory.operands]
+    if factory.op in COMMUTATIVE:
+        keys.sort(key=repr)
+
+    return (factory.op, *keys)
+
+def fused_predicate(factory: SelectionFactory) -> Optional[Callable[[Node], bool]]:
+    '''
+    Combines an expression into a single test on a node, if every factory in it has a
+    predicate and isn't indexed.
+    '''
+    if factory.op is None:
+        return None if factory.indexed else factory.predicate
+
+    predicates = [fused_predicate(operand) for operand in factory.operands]
+    if None in predicates:
+        return None
+
+    match factory.op, predicates:
+        case 'and', (a, b):
+            return lambda node: a(node) and b(node)
+        case 'or', (a, b):
+            return lambda node: a(node) or b(node)
+        case 'sub', (a, b):
+            return lambda node: a(node) and not b(node)
+        case 'xor', (a, b):
+            return lambda node: bool(a(node)) != bool(b(node))
+        case 'not', (a,):
+            return lambda node: not a(node)
+
+def compile_factory(factory: SelectionFactory) -> Callable[[Layer], Selection]:
+    '''
+    Compiles an expression of factories into a plan that runs it on a layer.
+
+    Parts of the expression made only of per-node predicates are fused into one pass
+    over the layer, and so are all of its series. Identical parts are run once per
+    call. The right side of & and - isn't run when the left side selects nothing,
+    nor the right side of | when the left side selects everything.
+    '''
+    plans: dict[Hashable, Plan] = {}
+
+    # one automaton for every series in the expression, and the index of each one in it
+    matcher = SeriesMatcher()
+    series_indices: dict[Hashable, int] = {}
+
+    def add_series(factory: SelectionFactory) -> None:
+        if factory.op is not None:
+            for operand in factory.operands:
+                add_series(operand)
+        elif factory.series is not None:
+            key = factory_key(factory)
+            if key not in series_indices:
+                series_indices[key] = matcher.add(*factory.series)
+
+    add_series(factory)
+
+    def run_series(layer: Layer, results: dict) -> None:
+        # the first series that's needed fills in the results for the rest
+        for key, selection in zip(series_indices, matcher.match(layer)):
+            results[key] = selection.bits
+
+    def plan_for(factory: SelectionFactory) -> Plan:
+        key = factory_key(factory)
+
+        if key in plans:
+            return plans[key]
+
+        # a single factory runs its own condition, which may be quicker than its predicate
+        predicate = fused_predicate(factory) if factory.op is not None else None
+
+        if predicate is not None:
+            def run(layer: Layer, results: dict) -> int:
+                return bits_from_positions(
+                    (i for i, node in enumerate(layer.nodes) if predicate(node)), len(layer.ids))
+        elif factory.series is not None:
+            def run(layer: Layer, results: dict) -> int:
+                run_series(layer, results)
+                return results[key]
+        elif factory.op is None:
+            condition = factory.condition
+
+            def run(layer: Layer, results: dict) -> int:
+                return condition(layer).bits
+        else:
+            run = combine(factory.op, [plan_for(operand) for operand in factory.operands])
+
+        def memoized(layer: Layer, results: dict) -> int:
+            if key not in results:
+                results[key] = run(layer, results)
+            return results[key]
+
+        plans[key] = memoized
+        return memoized
+
+    root = plan_for(factory)
+
+    return lambda layer: Selection.from_bits(layer, root(layer, {}))
+
+def combine(op: str, operands: List[Plan]) -> Plan:
+    def everything(layer: Layer) -> int:
+        return (1 << len(layer.ids)) - 1
+
+    match op, operands:
+        case 'and', (a, b):
+            def run(layer, results):
+                left = a(layer, results)
+                return left & b(layer, results) if left else 0
+        case 'or', (a, b):
+            def run(layer, results):
+                left = a(layer, results)
+                return left if left == everything(layer) else left | b(layer, results)
+        case 'sub', (a, b):
+            def run(layer, results):
+                left = a(layer, results)
+                return left & ~b(layer, results) if left else 0
+        case 'xor', (a, b):
+            def run(layer, results):
+                return a(layer, results) ^ b(layer, results)
+        case 'not', (a,):
+            def run(layer, results):
+                return everything(layer) & ~a(layer, results)
+        case _:
+            raise ValueError(f"unknown operator '{op}'")
+
+    return run
     
 # --------------------------------- Functions -------------------------------- #
 
@@ -99,39 +372,196 @@ INITIAL = 0
 MEDIAL = 1
 FINAL = 2
 
+def hashable_key(*parts) -> Optional[Hashable]:
+    # values that can't be hashed just don't share their results
+    try:
+        hash(parts)
+    except TypeError:
+        return None
+
+    return parts
+
+class SeriesMatcher:
+    '''
+    Finds many series of values in a layer at once, with an Aho–Corasick automaton.
+
+    Every occurrence of each series is found, including overlapping ones. A position
+    of INITIAL, MEDIAL or FINAL only keeps the occurrences at the start of the layer,
+    away from both ends, or at the end of the layer; any other position keeps them all.
+    '''
+
+    def __init__(self, patterns: Iterable[Tuple[Sequence, int]] = ()):
+        '''
+        Instantiates a SeriesMatcher object.
+
+        Args:
+            patterns: (values, position) pairs to add right away.
+        '''
+        self.patterns: List[Tuple[Tuple, int]] = []
+
+        # the automaton: transitions, failure links, the patterns that end at each state,
+        # and those patterns along with the ones that end at its failure links
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._ends: List[List[int]] = [[]]
+        self._out: List[List[int]] = [[]]
+        self._built = True
+
+        # patterns with values that can't be hashed are matched one by one instead
+        self._unhashable: List[int] = []
+
+        for values, position in patterns:
+            self.add(values, position)
+
+    def add(self, values: Sequence, position: int = -1) -> int:
+        '''
+        Adds a series to look for.
+
+        Returns:
+            int: The index of the series' selection in the results of match().
+        '''
+        values = tuple(values)
+
+        if not values:
+            raise ValueError("a series needs at least one value")
+
+        index = len(self.patterns)
+        self.patterns.append((values, position))
+
+        try:
+            hash(values)
+        except TypeError:
+            self._unhashable.append(index)
+            return index
+
+        state = 0
+        for value in values:
+            next_state = self._goto[state].get(value)
+
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][value] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._ends.append([])
+                self._out.append([])
+
+            state = next_state
+
+        self._ends[state].append(index)
+        self._built = False
+
+        return index
+
+    def _build(self) -> None:
+        # breadth-first, so that the failure links of shallower states are set first
+        queue = deque(self._goto[0].values())
+
+        for state in queue:
+            self._fail[state] = 0
+            self._out[state] = self._ends[state]
+
+        while queue:
+            state = queue.popleft()
+
+            for value, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail = self._fail[state]
+                while fail and value not in self._goto[fail]:
+                    fail = self._fail[fail]
+
+                self._fail[next_state] = self._goto[fail].get(value, 0)
+                self._out[next_state] = self._ends[next_state] + self._out[self._fail[next_state]]
+
+        self._built = True
+
+    # ---------------------------------------------------------------------------- #
+
+    def occurrences(self, data: Sequence) -> Iterator[Tuple[int, int]]:
+        '''
+        Yields (pattern index, end position) for every occurrence of every series, in one pass.
+        '''
+        if not self._built:
+            self._build()
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+
+        for i, value in enumerate(data):
+            try:
+                while state and value not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(value, 0)
+            except TypeError:
+                # an unhashable value can't be in any of the hashable series
+                state = 0
+                continue
+
+            for index in out[state]:
+                yield index, i
+
+        for index in self._unhashable:
+            values = self.patterns[index][0]
+            length = len(values)
+
+            for start in range(len(data) - length + 1):
+                if all(data[start + j] == values[j] for j in range(length)):
+                    yield index, start + length - 1
+
+    def match(self, layer: Layer) -> List[Selection]:
+        '''
+        Finds every series in the layer.
+
+        Returns:
+            List[Selection]: The nodes in each series' occurrences, in the order the series were added.
+        '''
+        data = layer.values()
+        n = len(data)
+
+        positions: List[List[int]] = [[] for _ in self.patterns]
+
+        for index, end in self.occurrences(data):
+            values, position = self.patterns[index]
+            start = end - len(values) + 1
+
+            if position == INITIAL and start != 0:
+                continue
+            if position == MEDIAL and (start == 0 or end == n - 1):
+                continue
+            if position == FINAL and end != n - 1:
+                continue
+
+            positions[index].extend(range(start, end + 1))
+
+        return [Selection.from_bits(layer, bits_from_positions(p, n)) for p in positions]
+
 def series(values: List, position: int = -1) -> Selection:
-    def wrapper(layer: Layer) -> bool:
+    matcher = SeriesMatcher([(values, position)])
 
-        selection = set()
-        single_series = set()
-
-        final_node = layer.nodes[-1]
-
-        nodes = layer.nodes[1:-1] if position == MEDIAL else layer.nodes
-
-        for node in nodes:
-            i = len(single_series)
-            if node.data == values[i]:
-                single_series.add(node.id)
-
-                if i == len(values) - 1:
-                    if position == FINAL:
-                        if final_node.id in single_series:
-                            selection |= single_series
-                    else:
-                        selection |= single_series
-                    single_series.clear()
-            else:
-                if position == INITIAL:
-                    break
-                single_series.clear()
-        
-        return Selection(layer, selection)
+    def wrapper(layer: Layer) -> bool:
+        return matcher.match(layer)[0]
 
-    return SelectionFactory(wrapper)
+    return SelectionFactory(
+        wrapper, key=hashable_key('series', tuple(values), position), series=(tuple(values), position))
 
 def matches(value) -> Selection:
     def wrapper(layer: Layer) -> bool:
-        return Selection.select(lambda node: node.data == value, layer)
+        return Selection.from_bits(layer, bits_from_positions(layer.positions_of(value), len(layer.ids)))
     
-    return SelectionFactory(wrapper)
+    return SelectionFactory(
+        wrapper, predicate=lambda node: node.data == value, key=hashable_key('matches', value), indexed=True)
+
+def matches_any(values: Iterable) -> Selection:
+    values = list(values)
+
+    def wrapper(layer: Layer) -> bool:
+        positions = itertools.chain.from_iterable(layer.positions_of(value) for value in values)
+        return Selection.from_bits(layer, bits_from_positions(positions, len(layer.ids)))
+
+    return SelectionFactory(
+        wrapper,
+        predicate=lambda node: any(node.data == value for value in values),
+        key=hashable_key('matches_any', tuple(values)),
+        indexed=True
+    )
@@ -1,15 +1,7 @@
 # not even a pytest
+# run it directly, or use `python -m src.alignments`
 
-from src.alignments.alignments import Alignments, bindings_logger
+if __name__ == '__main__':
+    from src.alignments.__main__ import repl
 
-uinput = ""
-
-print('oh hello there. enter a phrase to align, or ".exit" to quit.')
-while True:
-    uinput = input('>>> ')
-    if uinput == ".exit":
-        break
-    else:
-        bindings_logger.disabled = True
-        alignments = Alignments.alignments_from_text(uinput)
-        print(alignments)
\ No newline at end of file
+    repl()
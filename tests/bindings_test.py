@@ -1,3 +1,5 @@
+import pytest
+
 from src.alignments.alignments import Bindings, Layer, Alignments
 from src.class_register import _registry
 from tests.configure_logger import configure_logger
@@ -155,3 +157,78 @@ def test_grouping():
     assert Bindings.group(bindings_down, by_common_singular_inputs=True) \
         == {(a.id, b.id): [d.id],
             (c.id,): [e.id, f.id]}
+
+def test_bind_groups():
+    reset()
+
+    a, b, c, d, e, f = sample_nodes(6)
+
+    layers = Alignments([Layer([a, b, c]), Layer([d, e, f])])
+
+    layers.bind_groups([((a.id, b.id), (d.id,)), ((c.id,), (e.id, f.id))])
+    layers.bind_many([(c.id, e.id), (a.id, e.id)])
+
+    assert layers.layers[0].bindings.bindings_down == {a.id: [d.id, e.id], b.id: [d.id], c.id: [e.id, f.id]}
+    assert layers.layers[1].bindings.bindings_up == {d.id: [a.id, b.id], e.id: [c.id, a.id], f.id: [c.id]}
+
+    # Node #3 is not in the first layer
+    with pytest.raises(TypeError):
+        layers.bind_many([(d.id, a.id)], validate=True)
+
+def test_bind_groups_duplicates():
+    reset()
+
+    a, b, c = sample_nodes(3)
+
+    layers = Alignments([Layer([a, b]), Layer([c])])
+    layers.bind_groups([((a.id, b.id, a.id), (c.id, c.id))])
+
+    assert layers.layers[0].bindings.bindings_down == {a.id: [c.id], b.id: [c.id]}
+    assert layers.layers[1].bindings.bindings_up == {c.id: [a.id, b.id]}
+
+def test_grouping_modes():
+    bindings = {0: [10], 1: [10, 11], 2: [11], 3: [12], 4: [], 5: [12]}
+
+    assert Bindings.group(bindings) \
+        == {(0,): [10], (1,): [10, 11], (2,): [11], (3, 5): [12], (4,): []}
+    assert Bindings.group(bindings, by_common_singular_inputs=True) \
+        == {(0, 1, 2): [10, 11], (3, 5): [12], (4,): []}
+
+def test_grouping_long_layer():
+    # more groups than the recursion limit
+    bindings = {i: [i + 10000] for i in range(5000)}
+
+    assert len(Bindings.group(bindings)) == 5000
+
+def test_all_node_bindings():
+    reset()
+
+    a, b, c, d = sample_nodes(4)
+
+    layers = Alignments([Layer([a, b, c]), Layer([d])])
+    layers.bind(b, d)
+
+    padded = layers.layers[0].bindings.all_node_bindings('down')
+
+    assert dict(padded) == {b.id: [d.id], a.id: [], c.id: []}
+    assert list(padded) == [b.id, a.id, c.id]
+    assert d.id not in padded
+
+    # it's a view, so later bindings show up in it
+    layers.bind(a, d)
+    assert padded[a.id] == [d.id]
+
+def test_ungroup_bindings_copies():
+    reset()
+
+    a, b, c = sample_nodes(3)
+
+    layers = Alignments([Layer([a]), Layer([b, c])])
+    layers.bind(a, c)
+    layers.bind(a, b)
+
+    padded = layers.layers[0].bindings.all_node_bindings('down')
+
+    assert Bindings.ungroup_bindings(padded) == [(a.id, b.id), (a.id, c.id)]
+    # the stored bindings keep the order they were bound in
+    assert layers.layers[0].bindings.bindings_down == {a.id: [c.id, b.id]}
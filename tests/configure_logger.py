@@ -1,16 +1,8 @@
 import logging
 
+from src.logger import configure_logger as _configure_logger
 
-def configure_logger(name):
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-
-    handler = logging.StreamHandler()
-    handler.setLevel(logging.DEBUG)
-
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
 
-    logger.addHandler(handler)
-
-    return logger
\ No newline at end of file
+def configure_logger(name):
+    # the tests see everything that's logged
+    return _configure_logger(name, level=logging.DEBUG)
@@ -0,0 +1,8 @@
+import pytest
+
+from tests.tools import FakeAligner
+
+
+@pytest.fixture
+def fake_aligner(tmp_path, monkeypatch):
+    return FakeAligner(tmp_path, monkeypatch)
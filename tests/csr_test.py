@@ -0,0 +1,99 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from src.alignments.alignments import Alignments, Layer
+from src.alignments.csr import CSRMatrix
+from src.class_register import registry_scope
+from tests.tools import sample_nodes
+
+
+def test_matrix():
+    matrix = CSRMatrix.from_groups([([0, 1], [0]), ([2], [1, 2])], n_rows=3, n_cols=3)
+
+    assert list(matrix.row(0)) == [0]
+    assert list(matrix.row(2)) == [1, 2]
+    assert matrix.multiply({ 0: 1, 1: 1, 2: 1 }) == { 0: 2, 1: 1, 2: 1 }
+
+    transposed = matrix.transpose()
+
+    assert list(transposed.row(0)) == [0, 1]
+    assert list(transposed.row(2)) == [2]
+
+def random_alignments(csr: bool) -> Alignments:
+    rng = random.Random(0)
+
+    nodes = sample_nodes(24)
+    layers = Alignments([Layer(nodes[i:i + 6]) for i in range(0, 24, 6)], csr=csr)
+
+    # every node is bound both ways at least once, so that each one can be translated
+    for k in range(3):
+        for node in nodes[6 * k:6 * k + 6]:
+            layers.bind(node, rng.choice(nodes[6 * k + 6:6 * k + 12]))
+        for node in nodes[6 * k + 6:6 * k + 12]:
+            layers.bind(rng.choice(nodes[6 * k:6 * k + 6]), node)
+        for _ in range(6):
+            layers.bind(rng.choice(nodes[6 * k:6 * k + 6]), rng.choice(nodes[6 * k + 6:6 * k + 12]))
+
+    return layers
+
+def test_same_translations():
+    # the registries are kept, so the nodes can be looked up after the blocks
+    with registry_scope(release=False):
+        expected = random_alignments(csr=False)
+    with registry_scope(release=False):
+        actual = random_alignments(csr=True)
+
+    def ids(result):
+        return [[n.id for n in r] if isinstance(r, list) else r.id for r in result]
+
+    for layer in range(4):
+        e_nodes = expected.layers[layer].nodes
+        a_nodes = actual.layers[layer].nodes
+
+        for amount in range(1, 4 - layer):
+            for respective in (False, True):
+                assert ids(actual.translate_down(a_nodes, amount, respective)) \
+                    == ids(expected.translate_down(e_nodes, amount, respective))
+
+        for amount in range(1, layer + 1):
+            for respective in (False, True):
+                assert ids(actual.translate_up(a_nodes, amount, respective)) \
+                    == ids(expected.translate_up(e_nodes, amount, respective))
+
+def test_alignments_from_word():
+    word = SimpleNamespace(alignments=(['a', 'bc', 'd'], ['A', 'B', 'CD']))
+
+    with registry_scope(release=False):
+        expected = Alignments.alignments_from_word(word)
+    with registry_scope():
+        actual = Alignments.alignments_from_word(word, csr=True)
+
+        # the matrices were built from the word, and match the ones compiled from the bindings
+        matrices = actual._matrices
+        compiled = actual.compile()
+
+        for built, from_bindings in zip(matrices[0], compiled[0]):
+            assert built.indptr == from_bindings.indptr
+            assert built.indices == from_bindings.indices
+
+        assert [n.data for n in actual.translate_down(actual.layers[0].nodes, 1)] \
+            == [n.data for n in expected.translate_down(expected.layers[0].nodes, 1)]
+
+def test_unbound_nodes():
+    for csr in (False, True):
+        with registry_scope():
+            a, b, c, d = sample_nodes(4)
+            layers = Alignments([Layer([a, b]), Layer([c, d]), Layer([])], csr=csr)
+            layers.bind(a, c)
+
+            # both translations fail the same way for a node that was never bound
+            with pytest.raises(KeyError):
+                layers.translate_down([b], 1)
+            with pytest.raises(KeyError):
+                layers.translate_up([d], 1)
+
+            # and for one that's reached on the way, but isn't bound any further
+            with pytest.raises(KeyError):
+                layers.translate_down([a], 2)
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.aligner.g2p_batch import BatchedInfer, convert_batch
+
+
+def counted_infer():
+    calls = []
+
+    def infer(words):
+        calls.append(list(words))
+        return [word.upper() for word in words]
+
+    return infer, calls
+
+def test_batched_infer():
+    infer, calls = counted_infer()
+    batched_infer = BatchedInfer(infer)
+
+    batched_infer.prefetch(['b', 'a', 'b'])
+
+    assert batched_infer(['a']) == ['A']
+    assert batched_infer(['b', 'a', 'b']) == ['B', 'A', 'B']
+    assert calls == [['b', 'a']]
+
+    batched_infer.clear()
+    assert batched_infer.inferred == {}
+
+    # words that weren't prefetched aren't kept
+    assert batched_infer(['c', 'a', 'c']) == ['C', 'A', 'C']
+    assert calls[-1] == ['c', 'a']
+    assert batched_infer.inferred == {}
+
+def test_convert_batch():
+    pytest.importorskip('Aquila_Resolve')
+
+    infer, calls = counted_infer()
+
+    class StubG2p:
+        def __init__(self):
+            self.infer = infer
+            self.h2p = SimpleNamespace(tokenize=str.split, dict=SimpleNamespace(contains=lambda word: False))
+            self.dict = SimpleNamespace(get=lambda word: None)
+
+        def convert(self, long_form):
+            return ' '.join(self.infer([word])[0] for word in long_form.split())
+
+    g2p = StubG2p()
+
+    # each word is inferred once for the whole batch, and the results are in input order
+    assert convert_batch(g2p, ['b a', 'a c', 'b']) == ['B A', 'A C', 'B']
+    assert calls == [['b', 'a', 'c']]
+
+    # and the words aren't kept once the batch is done
+    assert g2p.infer.inferred == {}
+    assert convert_batch(g2p, ['a']) == ['A']
+    assert calls[-1] == ['a']
@@ -0,0 +1,73 @@
+import gc
+import json
+import time
+
+from src.aligner import g2p_cache
+from src.aligner.g2p_cache import G2pCache
+
+
+def test_hits_and_misses():
+    calls = []
+
+    def g2p(long_form):
+        calls.append(long_form)
+        return long_form.upper()
+
+    cache = G2pCache(g2p)
+
+    assert cache('the') == 'THE'
+    assert cache('the') == 'THE'
+    assert cache('and') == 'AND'
+
+    assert calls == ['the', 'and']
+    assert cache.info().hits == 1
+    assert cache.info().misses == 2
+
+def test_eviction():
+    cache = G2pCache(str.upper, maxsize=2)
+
+    cache('a')
+    cache('b')
+    cache('a') # 'b' is now the least recently used
+    cache('c')
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.info().evictions == 1
+
+def test_ttl():
+    cache = G2pCache(str.upper, ttl=0.01)
+
+    cache('a')
+    time.sleep(0.02)
+
+    assert 'a' not in cache
+
+def test_persistence(tmp_path):
+    path = tmp_path / 'g2p.json'
+
+    cache = G2pCache(str.upper)
+    cache('a')
+    cache('b')
+    cache.save(path)
+
+    warm_cache = G2pCache(lambda _: None, path=path)
+
+    assert warm_cache('a') == 'A'
+    assert warm_cache('b') == 'B'
+    assert warm_cache.info().misses == 0
+
+def test_saved_at_exit(tmp_path):
+    path = tmp_path / 'g2p.json'
+
+    cache = G2pCache(str.upper, path=path)
+    cache('a')
+
+    g2p_cache._save_persistent_caches()
+    assert json.loads(path.read_text()) == { 'a': 'A' }
+
+    # the exit hook doesn't keep the cache alive
+    del cache
+    gc.collect()
+    assert not any(c.path == path for c in g2p_cache._persistent_caches)
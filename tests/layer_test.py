@@ -1,5 +1,7 @@
-from src.alignments.alignments import Layer, Alignments
-from src.class_register import _registry
+import pytest
+
+from src.alignments.alignments import Layer, Alignments, Node
+from src.class_register import _registry, registry_scope
 from tests.configure_logger import configure_logger
 from tests.tools import sample_nodes, reset
 
@@ -116,4 +118,133 @@ def test_translation():
     assert layers.translate_up(nodes[6:9], 1, return_respective_lists=True) == [[nodes[3]], [nodes[4]], [nodes[5]]]
 
     assert layers.translate_to_layer(nodes[3:6], 0) == nodes[0:3]
-    
\ No newline at end of file
+    
+def test_layer_from_data():
+    reset()
+
+    layer = Layer.from_data('ABCA')
+
+    assert list(layer.ids) == [0, 1, 2, 3]
+    assert layer.symbols[0] == layer.symbols[3] # 'A' is only stored once
+
+    # no nodes are created until they are looked up
+    assert layer.contains_id(2)
+    assert not layer.contains_id(4)
+    assert layer._nodes is None
+
+    assert [node.data for node in layer.nodes] == ['A', 'B', 'C', 'A']
+    assert all(node.layer is layer for node in layer.nodes)
+    assert Node.id(1) is layer.nodes[1]
+
+    layer.append(Node('D'))
+
+    assert layer.contains_id(4)
+    assert layer.nodes[-1].data == 'D'
+
+def test_positions():
+    reset()
+
+    a, b, c, d = sample_nodes(4)
+    layer = Layer([a, b])
+
+    assert layer.position(b.id) == 1
+    assert layer.position(c.id) is None
+
+    layer.append(c)
+    layer.insert(0, d)
+
+    assert [layer.position(n.id) for n in (d, a, b, c)] == [0, 1, 2, 3]
+
+    layers = Alignments([Layer([]), layer])
+
+    assert layer.ordinal == 1
+    assert layers.layer_number(layer) == 1
+
+def test_translation_cache():
+    reset()
+
+    layers = Alignments(3)
+
+    a, b, c, d, e = sample_nodes(5)
+
+    layers.layers[0].set([a])
+    layers.layers[1].set([b, c])
+    layers.layers[2].set([d, e])
+
+    layers.bind(a, b)
+    layers.bind(b, d)
+    layers.bind(c, e)
+
+    assert layers.translate_down([a], 2) == [d]
+
+    # binding a to c as well invalidates the cached translation of a
+    layers.bind(a, c)
+
+    assert layers.translate_down([a], 2) == [d, e]
+    assert layers.translate_down([a, a], 2) == [d, d, e, e]
+    assert layers.translate_to_layer([d, e], 0) == [a, a]
+
+def test_translation_cache_direct_bindings():
+    for csr in (False, True):
+        reset()
+
+        a, b, c = sample_nodes(3)
+        layers = Alignments([Layer([a]), Layer([b, c])], csr=csr)
+
+        layers.bind(a, b)
+        assert layers.translate_down([a], 1) == [b]
+
+        # binding through the layers' bindings, rather than the alignments, is seen too
+        layers.layers[0].bindings.bind_down(a.id, c.id)
+        layers.layers[1].bindings.bind_up(c.id, a.id)
+
+        assert layers.translate_down([a], 1) == [b, c]
+        assert layers.translate_up([c], 1) == [a]
+
+def test_nodes_stay_in_sync():
+    reset()
+
+    a, b, c = sample_nodes(3)
+    nodes = [a, b]
+    layer = Layer(nodes)
+
+    # the layer keeps its own copy of the list, and its nodes can only be changed through it
+    nodes.append(c)
+    assert layer.nodes == [a, b]
+
+    with pytest.raises(TypeError):
+        layer.nodes.append(c)
+    with pytest.raises(TypeError):
+        layer.nodes[0] = c
+
+    layer.append(c)
+    assert layer.nodes == [a, b, c]
+    assert list(layer.ids) == [a.id, b.id, c.id]
+
+def test_nodes_from_another_registry():
+    reset()
+
+    b, a = Node('B'), Node('A')
+
+    with registry_scope():
+        # the nodes' IDs and symbols mean nothing in the layer's registry
+        with pytest.raises(ValueError):
+            Layer([b, a])
+
+        layer = Layer([])
+        with pytest.raises(ValueError):
+            layer.append(a)
+
+def test_data_of_a_dropped_node():
+    reset()
+
+    a, b = sample_nodes(2)
+    layer = Layer([a])
+    layer.set_this_layer_for_all_nodes()
+    layer.set([b])
+
+    # a still thinks it's in the layer, but isn't any more
+    a.data = 'C'
+
+    assert a.data == 'C'
+    assert layer.values() == ['B']
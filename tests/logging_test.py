@@ -0,0 +1,34 @@
+import logging
+
+import pytest
+
+from src.alignments.__main__ import main
+from src.alignments.alignments import bindings_logger
+from src.logger import SamplingFilter, configure_logger
+
+
+def test_configure_logger_twice():
+    logger = configure_logger("test_configure_logger_twice")
+    configure_logger("test_configure_logger_twice")
+
+    assert len(logger.handlers) == 1
+
+def test_bindings_logger_is_quiet():
+    # library loggers don't log anywhere unless the application configures them
+    assert not bindings_logger.isEnabledFor(logging.DEBUG)
+    assert all(isinstance(h, logging.NullHandler) for h in bindings_logger.handlers)
+
+def test_sampling():
+    record = logging.LogRecord("bindings", logging.DEBUG, __file__, 0, "binding up: %d -> %d", (0, 1), None)
+
+    assert not SamplingFilter(0).filter(record)
+    assert SamplingFilter(1).filter(record)
+
+    record.levelno = logging.WARNING
+    assert SamplingFilter(0).filter(record)
+
+def test_sample_needs_debug(capsys):
+    with pytest.raises(SystemExit):
+        main(['--sample', '0.1', 'hello'])
+
+    assert '--sample only applies with --debug' in capsys.readouterr().err
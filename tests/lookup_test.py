@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+from src.aligner.lookup import AlignmentLookup, cmudict_lookup
+from tests.tools import word
+
+
+def test_cmudict_lookup():
+    # a hit
+    assert cmudict_lookup.get(word('read', '{R EH1 D}')) == [[['r'], ['e', 'a'], ['d']], [['R'], ['EH'], ['D']]]
+
+    # a miss: the pronunciation isn't in the dictionary
+    assert cmudict_lookup.get(word('read', '{R IY1 D}')) is None
+    assert word('read', '{R IY1 D}') not in cmudict_lookup
+
+    # a variant: the same word, capitalized, is found under the same key
+    assert word('Read', '{R EH1 D}') in cmudict_lookup
+    assert cmudict_lookup.get(word('Read', '{R EH1 D}')) == [[['R'], ['e', 'a'], ['d']], [['R'], ['EH'], ['D']]]
+
+def test_pronunciation_variants(tmp_path):
+    path = tmp_path / 'alignments'
+    path.write_text(
+        'r|e:a|d|\tR|IY|D|\n'
+        'r|e:a|d|\tR|EH|D|\n'
+        'r|e|a:d|\tR|EH|D|\n' # the same pair again; the first alignment is kept
+        'not an alignment\n'
+        'a|\tAH|' # no newline at the end of the file
+    )
+
+    lookup = AlignmentLookup(path)
+
+    assert len(lookup) == 3
+    assert lookup.get(word('read', '{R IY1 D}')) == [[['r'], ['e', 'a'], ['d']], [['R'], ['IY'], ['D']]]
+    assert lookup.get(word('read', '{R EH1 D}')) == [[['r'], ['e', 'a'], ['d']], [['R'], ['EH'], ['D']]]
+    assert lookup.get(word('a', '{AH0}')) == [[['a']], [['AH']]]
+    assert lookup.get(word('reed', '{R IY1 D}')) is None
+
+def test_ready(tmp_path, monkeypatch):
+    path = tmp_path / 'alignments'
+    path.write_text('a|\tAH|\n')
+
+    threads = []
+    load = AlignmentLookup.load
+
+    def recorded_load(path):
+        threads.append(threading.current_thread())
+        return load(path)
+
+    monkeypatch.setattr(AlignmentLookup, 'load', staticmethod(recorded_load))
+
+    lookup = AlignmentLookup(path)
+    asyncio.run(lookup.ready())
+    asyncio.run(lookup.ready())
+
+    # the index was read once, off the event loop's thread
+    assert len(threads) == 1
+    assert threads[0] is not threading.current_thread()
+    assert len(lookup) == 1
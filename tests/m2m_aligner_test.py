@@ -0,0 +1,168 @@
+import asyncio
+import os
+
+import pytest
+
+from src.aligner import m2m_aligner
+from src.aligner.m2m_aligner import M2MAlignerError, M2MAlignerPool, Unaligned, align_lines, default_pool
+
+
+def test_align_lines(fake_aligner):
+    output = asyncio.run(align_lines(['a b\tA B', 'q\tK', 'c\tC']))
+
+    # the line that couldn't be aligned is reported, rather than left out
+    assert output == ['a|b|\tA|B|\n', 'c|\tC|\n', Unaligned('q\tK')]
+    assert output[2].key == ('q', 'K')
+
+def test_align_lines_failure(fake_aligner):
+    fake_aligner.fail(1)
+
+    with pytest.raises(M2MAlignerError):
+        asyncio.run(align_lines(['a\tA']))
+
+def assert_reaped(pid: int) -> None:
+    # a zombie can still be signalled, so the process is gone only once it's been waited for
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+def test_align_lines_timeout(fake_aligner):
+    fake_aligner.delay(30)
+
+    with pytest.raises(M2MAlignerError, match='timed out'):
+        asyncio.run(align_lines(['a\tA'], timeout=0.5))
+
+    assert_reaped(fake_aligner.pids[0])
+
+def test_align_lines_cancelled(fake_aligner):
+    fake_aligner.delay(30)
+
+    async def run():
+        task = asyncio.ensure_future(align_lines(['a\tA']))
+
+        # wait until the aligner has started
+        while not fake_aligner.runs:
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    assert_reaped(fake_aligner.pids[0])
+
+# ---------------------------------------------------------------------------- #
+#                                  Worker pool                                 #
+# ---------------------------------------------------------------------------- #
+
+def crash_runs(monkeypatch, crashes: int) -> None:
+    # makes the next few batches raise something other than an aligner error, which crashes the worker
+    align = m2m_aligner.align_lines
+    remaining = [crashes]
+
+    async def crashing(lines, **kwargs):
+        if remaining[0]:
+            remaining[0] -= 1
+            raise RuntimeError('worker crashed')
+        return await align(lines, **kwargs)
+
+    monkeypatch.setattr(m2m_aligner, 'align_lines', crashing)
+
+def test_pool_batches_in_order(fake_aligner):
+    async def run():
+        async with M2MAlignerPool(workers=1) as pool:
+            return await asyncio.gather(
+                pool.align(['a\tA', 'b\tB']),
+                pool.align(['c\tC', 'b\tB', 'q\tK']),
+                pool.align([])
+            )
+
+    first, second, third = asyncio.run(run())
+
+    # both requests were aligned in one run, and each gets its own lines back in order
+    assert fake_aligner.runs == 1
+    assert first == ['a|\tA|\n', 'b|\tB|\n']
+    assert second == ['b|\tB|\n', 'c|\tC|\n', Unaligned('q\tK')]
+    assert third == []
+
+def test_pool_retries(fake_aligner):
+    fake_aligner.fail(2)
+
+    async def run():
+        async with M2MAlignerPool(workers=1, max_restarts=2, restart_delay=0) as pool:
+            return await pool.align(['a\tA'])
+
+    assert asyncio.run(run()) == ['a|\tA|\n']
+    assert fake_aligner.runs == 3
+
+def test_pool_gives_up_on_a_batch(fake_aligner):
+    fake_aligner.fail(5)
+
+    async def run():
+        async with M2MAlignerPool(workers=1, max_restarts=1, restart_delay=0) as pool:
+            with pytest.raises(M2MAlignerError):
+                await pool.align(['a\tA'])
+
+            # the worker is fine, so the next batch is aligned once the aligner works again
+            fake_aligner.fail(0)
+            return await pool.align(['b\tB'])
+
+    assert asyncio.run(run()) == ['b|\tB|\n']
+    assert fake_aligner.runs == 3
+
+def test_pool_restarts_crashed_workers(fake_aligner, monkeypatch):
+    crash_runs(monkeypatch, 1)
+
+    async def run():
+        async with M2MAlignerPool(workers=1, max_restarts=1, restart_delay=0) as pool:
+            with pytest.raises(RuntimeError):
+                await pool.align(['a\tA'])
+
+            return await asyncio.wait_for(pool.align(['a\tA']), 5)
+
+    assert asyncio.run(run()) == ['a|\tA|\n']
+
+def test_pool_fails_queued_jobs_when_workers_give_up(fake_aligner, monkeypatch):
+    crash_runs(monkeypatch, 1)
+
+    async def run():
+        async with M2MAlignerPool(workers=1, max_batch_size=1, max_restarts=0) as pool:
+            results = await asyncio.wait_for(
+                asyncio.gather(pool.align(['a\tA']), pool.align(['b\tB']), return_exceptions=True), 5)
+
+            return results, pool.running
+
+    (first, second), running = asyncio.run(run())
+
+    # the job that was waiting for the worker gets its error, instead of waiting forever
+    assert isinstance(first, RuntimeError)
+    assert isinstance(second, RuntimeError)
+    assert not running
+
+def test_pool_close(fake_aligner):
+    async def run():
+        pool = M2MAlignerPool(workers=2)
+        job = asyncio.ensure_future(pool.align(['a\tA']))
+
+        # the job is queued, but the workers haven't picked it up yet
+        await asyncio.sleep(0)
+        await pool.close()
+
+        assert not pool.running
+
+        with pytest.raises(asyncio.CancelledError):
+            await job
+
+    asyncio.run(run())
+    assert fake_aligner.runs == 0
+
+def test_default_pool():
+    async def run():
+        return default_pool(), default_pool()
+
+    first, second = asyncio.run(run())
+    other, _ = asyncio.run(run())
+
+    assert first is second
+    assert other is not first
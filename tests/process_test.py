@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+from src.aligner.process import fmt_input_word, input_word_key, output_line_is_word, output_line_key, remove_nulls
+
+
+def test_key_round_trip():
+    word = SimpleNamespace(long_form="Don't", pronunciation='{D OW1 N T}')
+
+    assert fmt_input_word(word) == 'd o n t\tD OW N T'
+    assert input_word_key(word) == ('d o n t', 'D OW N T')
+
+    # the aligner's output for a word has the same key as the word
+    assert output_line_key('d|o|n|t|\tD|OW|N|T|\n') == input_word_key(word)
+    assert output_line_is_word(word, 'd|o|n|t|\tD|OW|N|T|\n')
+    assert not output_line_is_word(word, 'd|o|n|e|\tD|AH|N|\n')
+
+def test_key_with_joined_and_null_chunks():
+    word = SimpleNamespace(long_form='axe', pronunciation='{AE1 K S}')
+
+    # 'x' is aligned to two phonemes, and the silent 'e' to nothing
+    assert output_line_key('a|x|e|\tAE|K:S|_|\n') == input_word_key(word)
+    assert output_line_key('a|x|e|\tAE|K:S|_|') == input_word_key(word)
+
+def test_remove_nulls():
+    assert remove_nulls('_ A _ B _') == 'A B'
+    assert remove_nulls('_') == ''
+    assert remove_nulls('A_B _C') == 'A_B _C'
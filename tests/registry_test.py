@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+import gc
+
+import pytest
+
+from src.alignments.alignments import Alignments, Layer, Node
+from src.class_register import current_registry, registry_scope
+from tests.tools import sample_nodes
+
+
+def test_scoped_ids():
+    outer = sample_nodes(3)
+
+    with registry_scope() as registry:
+        assert current_registry() is registry
+
+        a, b, c = sample_nodes(3)
+
+        assert (a.id, b.id, c.id) == (0, 1, 2)
+        assert Node.id(1) is b
+        assert a.registry is registry
+
+    assert current_registry() is not registry
+    assert registry.classes == {} # released when the scope ended
+    assert outer[0].registry is current_registry()
+
+def test_released_nodes_keep_their_data():
+    with registry_scope():
+        a, b = sample_nodes(2)
+
+    assert (a.data, b.data) == ('A', 'B')
+    assert repr(a) == 'Node(data=A, layer_id=0)'
+
+def test_alignments_keep_their_registry():
+    with registry_scope(release=False) as registry:
+        a, b = sample_nodes(2)
+        layers = Alignments([Layer([a]), Layer([b])])
+
+    layers.bind(a, b)
+
+    assert layers.registry is registry
+    assert layers.get_output_nodes_for_input(a) == [b]
+
+def test_weak_registry():
+    with registry_scope(weak=True):
+        a, b = sample_nodes(2)
+        del b
+        gc.collect()
+
+        assert Node.id(0) is a
+
+        # Node #1 should have been released
+        with pytest.raises(LookupError):
+            Node.id(1)
+
+def test_concurrent_ids():
+    with registry_scope() as registry:
+        # threads don't inherit the context, so they share the registry explicitly
+        def create_nodes(_):
+            with registry_scope(registry, release=False):
+                return sample_nodes(26)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            nodes = [node for batch in executor.map(create_nodes, range(64)) for node in batch]
+
+        assert sorted(node.id for node in nodes) == list(range(len(nodes)))
+        assert all(Node.id(node.id) is node for node in nodes)
+
+def test_scopes_in_threads():
+    def build(_):
+        with registry_scope():
+            a, b = sample_nodes(2)
+            layers = Alignments([Layer([a]), Layer([b])])
+            layers.bind(a, b)
+
+            return a.id, b.id, layers.output_ids_for_input(a)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(build, range(16)))
+
+    assert results == [(0, 1, [1])] * 16
+
+def test_slots():
+    with registry_scope():
+        a, b = sample_nodes(2)
+        layers = Alignments([Layer([a]), Layer([b])])
+
+        for instance in (a, layers.layers[0], layers.layers[0].bindings):
+            assert not hasattr(instance, '__dict__')
+
+        # the class still looks nodes up by ID, while instances have their own
+        assert Node.id(b.id) is b
+        assert b.id == 1
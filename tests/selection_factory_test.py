@@ -1,5 +1,5 @@
 from src.alignments.alignments import Layer
-from src.rule.selection import SelectionFactory, matches, series
+from src.rule.selection import SelectionFactory, SeriesMatcher, matches, matches_any, series
 from tests.tools import reset, sample_nodes
 
 reset()
@@ -30,3 +30,58 @@ def test_and_or_xor():
     assert (series_efgh ^ series_fg)(nodes).selection == {4, 7}
     assert (series_efgh | series_fg)(nodes).selection == {4, 5, 6, 7}
     assert (series_efgh & series_fg)(nodes).selection == {5, 6}
+
+def test_compiled():
+    calls = []
+
+    def counted(value):
+        def condition(layer):
+            calls.append(value)
+            return matches(value)(layer)
+        return SelectionFactory(condition, key=('counted', value))
+
+    a, b, c = counted('A'), counted('B'), counted('C')
+
+    # (a | b) is only run once, and c isn't run because (a & b) is empty
+    expression = ((a | b) - (a & b & c)) | ~(b | a)
+
+    assert expression(nodes).selection == set(range(10))
+    assert sorted(calls) == ['A', 'B']
+
+def test_fused():
+    seen = []
+
+    def is_vowel(node):
+        seen.append(node.id)
+        return node.data in 'AEIOU'
+
+    vowels = SelectionFactory(predicate=is_vowel)
+
+    # the whole expression is one pass over the layer
+    assert ((vowels | matches('B')) - matches('E'))(nodes).selection == {0, 1, 8}
+    assert len(seen) == 10
+
+def test_shared_series(monkeypatch):
+    passes = []
+    occurrences = SeriesMatcher.occurrences
+
+    def counted(self, data):
+        passes.append(len(self.patterns))
+        return occurrences(self, data)
+
+    monkeypatch.setattr(SeriesMatcher, 'occurrences', counted)
+
+    expression = (series(['A', 'B']) | series(['D', 'E'], 1) | series(['I', 'J'], 2)) - series(['B', 'C'])
+
+    # one automaton finds all four series, in a single pass over the layer
+    assert expression(nodes).selection == {0, 3, 4, 8, 9}
+    assert passes == [4]
+
+def test_indexed_leaves_not_fused():
+    reset()
+
+    layer = Layer.from_data(['A', 'B', 'C', 'A'])
+
+    # the index answers both sides, so the nodes are never created
+    assert (matches('A') | matches_any(['C']))(layer).selection == {layer.ids[0], layer.ids[2], layer.ids[3]}
+    assert layer._nodes is None
@@ -1,7 +1,11 @@
 
 
+import time
+
+import pytest
+
 from src.alignments.alignments import Layer, Node
-from src.rule.selection import Selection, matches, series
+from src.rule.selection import FINAL, INITIAL, Selection, SelectionFactory, SeriesMatcher, bits_from_positions, matches, matches_any, positions_from_bits, series
 from tests.tools import reset, sample_nodes
 
 
@@ -83,3 +87,126 @@ def test_cond():
     assert (test_3c(layer1) & test_3b(layer1)).selection == {4}
     assert (test_3c(layer1) - test_3b(layer1)).selection == {5}
 
+
+def test_bits():
+    reset()
+
+    layer = Layer(sample_nodes(70))
+    selection = Selection(layer, {1, 3, 69})
+
+    assert selection.bits == (1 << 1) | (1 << 3) | (1 << 69)
+    assert len(selection) == 3
+    assert 69 in selection and 2 not in selection
+    assert list(selection) == [1, 3, 69]
+
+    assert len(~selection) == 67
+    assert (~selection & selection).selection == set()
+    assert ~~selection == selection
+
+    other_layer = Layer(sample_nodes(2))
+
+    # selections for different layers can't be combined
+    with pytest.raises(ValueError):
+        selection | Selection(other_layer, set())
+
+def test_positions_from_bits_scales():
+    def decode(n):
+        bits = bits_from_positions(range(n), n)
+
+        start = time.perf_counter()
+        positions = list(positions_from_bits(bits))
+        elapsed = time.perf_counter() - start
+
+        assert positions == list(range(n))
+        return elapsed
+
+    assert list(positions_from_bits(0)) == []
+    assert list(positions_from_bits((1 << 8) | (1 << 70))) == [8, 70]
+
+    # a quadratic decode takes ~100 times as long for 10 times as many positions
+    small = min(decode(16_000) for _ in range(3))
+    large = min(decode(160_000) for _ in range(3))
+
+    assert large < 30 * small + 0.01
+
+def test_overlapping_series():
+    reset()
+
+    layer = Layer([Node(c) for c in 'AAABAAB'])
+
+    assert series(['A', 'A', 'B'])(layer).selection == {1, 2, 3, 4, 5, 6}
+    assert series(['A', 'A', 'B'], position=INITIAL)(layer).selection == set()
+    assert series(['A', 'B'], position=FINAL)(layer).selection == {5, 6}
+
+def test_series_matcher():
+    reset()
+
+    layer = Layer([Node(c) for c in 'ABCAB'])
+
+    matcher = SeriesMatcher([(['A', 'B'], -1), (['B', 'C', 'A'], -1), (['A', 'B'], INITIAL), (['X'], -1)])
+    ab, bca, initial_ab, x = matcher.match(layer)
+
+    assert ab.selection == {0, 1, 3, 4}
+    assert bca.selection == {1, 2, 3}
+    assert initial_ab.selection == {0, 1}
+    assert x.selection == set()
+
+def test_data_index():
+    reset()
+
+    a, b, c = Node('A'), Node('B'), Node('A')
+    layer = Layer([a, b, c])
+
+    assert layer.positions_of('A') == [0, 2]
+    assert matches_any(['A', 'B', 'X'])(layer).selection == {a.id, b.id, c.id}
+
+    # the index follows changes to the layer
+    d = Node('B')
+    layer.append(d)
+    assert matches('B')(layer).selection == {b.id, d.id}
+
+    e = Node('A')
+    layer.insert(0, e)
+    assert layer.positions_of('A') == [0, 1, 3]
+
+    # the index follows reassigned data, even for nodes that don't know their layer
+    assert b.layer is None
+    b.data = 'A'
+    assert matches('A')(layer).selection == {a.id, b.id, c.id, e.id}
+
+    # unhashable data is compared node by node
+    f = Node(['A'])
+    layer.append(f)
+    assert matches(['A'])(layer).selection == {f.id}
+
+def test_data_index_invalidation():
+    reset()
+
+    a, b = Node('A'), Node('B')
+    first, second = Layer([a, b]), Layer([b, a])
+    first.set_this_layer_for_all_nodes()
+    second.set_this_layer_for_all_nodes()
+
+    assert second.positions_of('A') == [1]
+
+    # the nodes belong to the first layer, but the second one sees the change too
+    a.data = 'B'
+    assert first.positions_of('B') == [0, 1]
+    assert second.positions_of('B') == [0, 1]
+    assert second.values() == ['B', 'B']
+
+    layer = Layer.from_data(['A', 'B', 'A'])
+    assert matches('A')(layer).selection == {layer.ids[0], layer.ids[2]}
+
+    Node.id(layer.ids[1]).data = 'A'
+    assert matches('A')(layer).selection == set(layer.ids)
+
+def test_matches_equal_values():
+    reset()
+
+    layer = Layer([Node(1), Node(1.0), Node(True), Node(2)])
+    twos = SelectionFactory(predicate=lambda node: node.data == 2)
+
+    # the index and the fused predicate agree on which values are equal
+    assert matches(1)(layer).selection == {0, 1, 2}
+    assert (matches(1) | twos)(layer).selection == {0, 1, 2, 3}
@@ -1,4 +1,7 @@
 
+import sys
+from types import SimpleNamespace
+
 from src.alignments.alignments import Node, Layer
 
 
@@ -8,4 +11,85 @@ def sample_nodes(i):
 
 def reset():
     Node.reset_all_id()
-    Layer.reset_all_id()
\ No newline at end of file
+    Layer.reset_all_id()
+
+def word(long_form, pronunciation):
+    # stands in for a Word, which needs the G2P model
+    return SimpleNamespace(long_form=long_form, pronunciation=pronunciation, alignments=None)
+
+# stands in for the m2m-aligner: each grapheme is aligned to the phoneme in the same place
+FAKE_ALIGNER = '''\
+import os
+import sys
+import time
+
+args = sys.argv[1:]
+output = args[args.index('-o') + 1]
+
+lines = sys.stdin.read().splitlines()
+
+# the number of lines and the process ID of each run
+with open(os.environ['FAKE_ALIGNER_RUNS'], 'a') as f:
+    f.write(f'{len(lines)} {os.getpid()}\\n')
+
+with open(os.environ['FAKE_ALIGNER_DELAY']) as f:
+    time.sleep(float(f.read()))
+
+# the number of runs that should fail before the aligner starts working
+with open(os.environ['FAKE_ALIGNER_FAILURES']) as f:
+    failures = int(f.read())
+
+if failures:
+    with open(os.environ['FAKE_ALIGNER_FAILURES'], 'w') as f:
+        f.write(str(failures - 1))
+    sys.exit('failing on purpose')
+
+with open(output, 'w') as f:
+    for line in lines:
+        graphemes, phonemes = line.split('\\t')
+
+        # 'q' stands in for a word that can't be aligned
+        if 'q' in graphemes.split():
+            continue
+
+        f.write('|'.join(graphemes.split()) + '|\\t' + '|'.join(phonemes.split()) + '|\\n')
+'''
+
+class FakeAligner:
+    def __init__(self, tmp_path, monkeypatch):
+        self.runs_path = tmp_path / 'runs'
+        self.failures_path = tmp_path / 'failures'
+        self.delay_path = tmp_path / 'delay'
+
+        self.runs_path.write_text('')
+        self.fail(0)
+        self.delay(0)
+
+        executable = tmp_path / 'm2m-aligner'
+        executable.write_text(f'#!{sys.executable}\n' + FAKE_ALIGNER)
+        executable.chmod(0o755)
+
+        monkeypatch.setattr('src.aligner.m2m_aligner.EXECUTABLE', executable)
+        monkeypatch.setenv('FAKE_ALIGNER_RUNS', str(self.runs_path))
+        monkeypatch.setenv('FAKE_ALIGNER_FAILURES', str(self.failures_path))
+        monkeypatch.setenv('FAKE_ALIGNER_DELAY', str(self.delay_path))
+
+    @property
+    def runs(self) -> int:
+        return len(self.batches)
+
+    @property
+    def batches(self) -> list[int]:
+        # the number of lines in each run
+        return [int(line.split()[0]) for line in self.runs_path.read_text().splitlines()]
+
+    @property
+    def pids(self) -> list[int]:
+        return [int(line.split()[1]) for line in self.runs_path.read_text().splitlines()]
+
+    def fail(self, runs: int) -> None:
+        self.failures_path.write_text(str(runs))
+
+    def delay(self, seconds: float) -> None:
+        # how long each run waits before it writes anything
+        self.delay_path.write_text(str(seconds))
@@ -0,0 +1,43 @@
+import asyncio
+
+from src.aligner.aligner import WordGroupAligner
+from tests.tools import word
+
+
+def sample_words():
+    return [
+        word('Cab', '{K AE1 B}'),
+        word('dab', '{D AE1 B}'),
+        word('cab', '{K AE1 B}'),
+        word('Cab', '{K AE1 B}'),
+        word('qat', '{K AE1 T}'), # the fake aligner can't align this one
+    ]
+
+def test_index_words():
+    words = sample_words()
+
+    # words with the same key are grouped, in the order they were given
+    assert WordGroupAligner.index_words(words) == {
+        ('c a b', 'K AE B'): [words[0], words[2], words[3]],
+        ('d a b', 'D AE B'): [words[1]],
+        ('q a t', 'K AE T'): [words[4]],
+    }
+
+def test_duplicates_aligned_once(fake_aligner):
+    words = sample_words()
+
+    aligner = WordGroupAligner(lookup=None)
+    for w in words:
+        aligner.add_word(w)
+
+    asyncio.run(aligner.align())
+
+    # one run of the aligner, with one line for each distinct word
+    assert fake_aligner.batches == [3]
+
+    # each word gets its own alignments back, with its own capitalization
+    assert words[0].alignments == [[['C'], ['a'], ['b']], [['K'], ['AE'], ['B']]]
+    assert words[1].alignments == [[['d'], ['a'], ['b']], [['D'], ['AE'], ['B']]]
+    assert words[2].alignments == [[['c'], ['a'], ['b']], [['K'], ['AE'], ['B']]]
+    assert words[3].alignments is words[0].alignments
+    assert words[4].alignments is None
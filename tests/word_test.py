@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip('Aquila_Resolve')
+
+
+def test_long_form_given():
+    from src.aligner.word import Word
+
+    def normalize(short_form):
+        raise AssertionError('the long form was already given')
+
+    word = Word('12', long_form='twelve', pronunciation='{T W EH1 L V}', normalize_numbers_function=normalize)
+
+    assert word.long_form == 'twelve'
+    assert word.is_expanded
+
+def test_lists_from_texts_normalizes_once(monkeypatch):
+    from src.aligner import word as word_module
+    from src.aligner.word import Word
+
+    calls = []
+    normalize_numbers = word_module.numbers.normalize_numbers
+
+    def counted(short_form):
+        calls.append(short_form)
+        return normalize_numbers(short_form)
+
+    monkeypatch.setattr(word_module.numbers, 'normalize_numbers', counted)
+
+    words = Word.list_from_text('12 cats', lambda long_forms: ['{X}'] * len(long_forms))
+
+    # each short form is normalized once, in the batch, and the words are given that long
+    # form, which they don't normalize again (see test_long_form_given)
+    assert len(calls) == len(words)
+    assert [word.long_form for word in words] == [normalize_numbers(word.short_form) for word in words]